@@ -0,0 +1,451 @@
+"""技能樹管理系統 (skill_tree11.py) 的效能基準測試
+
+在暫存資料夾以 skill_db.generate_database 產生測試資料庫，透過 SkillTreeManager 的
+實際操作流程量測載入、選取、新增、更新、刪除、查詢、JSON 匯入/匯出與 .mm 匯出的時間。
+沒有圖形介面時以 Treeview 替身執行 (預設)；有顯示器 (或 xvfb-run) 時可加 --tk 使用真正的 Tk。
+
+    python skill_bench.py --persons 2000 --periods 12 --output bench.jsonl
+    xvfb-run python skill_bench.py --tk
+
+結果以一個 JSON 物件輸出到 stdout，--output 指定時另外附加一行到該檔案，方便跨版本比較；
+程式本身的 [載入] 等訊息改輸出到 stderr
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import skill_db
+import skill_tree11
+
+#===========================================
+#  Tk 替身
+#===========================================
+class StubWidget:
+    """接受任何建構參數與方法呼叫的元件替身，保存 get/set/insert 的文字值與設定值"""
+
+    def __init__(self, *args, **options):
+        self.options = options
+        self.value = options.get('value', '')
+
+    def get(self, *args):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+    def insert(self, index, text):
+        self.value = f"{text}{self.value}" if index in (0, '1.0') else f"{self.value}{text}"
+
+    def delete(self, *args):
+        self.value = ''
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    config = configure
+
+    def cget(self, key):
+        return self.options.get(key, '')
+
+    def __getitem__(self, key):
+        return self.options.get(key, '')
+
+    def __setitem__(self, key, value):
+        self.options[key] = value
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+class StubTreeview(StubWidget):
+    """ttk.Treeview 替身，實作技能樹用到的節點操作"""
+
+    def __init__(self, *args, **options):
+        super().__init__(*args, **options)
+        self.items = {'': {'text': '', 'values': '', 'open': False, 'tags': ()}}
+        self.children = {'': []}
+        self.parents = {}
+        self.selected = ()
+        self.next_id = 0
+
+    def insert(self, parent, index, iid=None, **options):
+        if iid is None:
+            self.next_id += 1
+            iid = f"I{self.next_id:06d}"
+        if iid in self.items:
+            raise ValueError(f"Item {iid} already exists")
+        self.items[iid] = {'text': '', 'values': '', 'open': False, 'tags': ()}
+        self.items[iid].update(options)
+        self.children[iid] = []
+        self.parents[iid] = parent
+        if index == 'end':
+            self.children[parent].append(iid)
+        else:
+            self.children[parent].insert(int(index), iid)
+        return iid
+
+    def item(self, iid, option=None, **options):
+        if options:
+            self.items[iid].update(options)
+            return None
+        if option is not None:
+            return self.items[iid][option]
+        return dict(self.items[iid])
+
+    def exists(self, iid):
+        return iid in self.items
+
+    def parent(self, iid):
+        return self.parents.get(iid, '')
+
+    def get_children(self, iid=''):
+        return tuple(self.children[iid])
+
+    def index(self, iid):
+        return self.children[self.parents[iid]].index(iid)
+
+    def move(self, iid, parent, index):
+        self.children[self.parents[iid]].remove(iid)
+        self.children[parent].insert(len(self.children[parent]) if index == 'end' else int(index), iid)
+        self.parents[iid] = parent
+
+    def delete(self, *iids):
+        for iid in iids:
+            if iid not in self.items:
+                continue
+            self.delete(*self.children[iid])
+            self.children[self.parents.pop(iid)].remove(iid)
+            del self.items[iid], self.children[iid]
+        self.selected = tuple(iid for iid in self.selected if iid in self.items)
+
+    def selection(self):
+        return self.selected
+
+    def selection_set(self, *items):
+        if len(items) == 1 and isinstance(items[0], (list, tuple)):
+            items = items[0]
+        self.selected = tuple(items)
+
+    def focus(self, *args):
+        return self.selected[0] if self.selected else ''
+
+class StubRoot(StubWidget):
+    """Tk 根視窗替身，root.after 排入的工作由 pump 依序執行"""
+
+    def __init__(self):
+        super().__init__()
+        self.pending = {}
+        self.next_id = 0
+
+    def after(self, ms, func=None, *args):
+        self.next_id += 1
+        self.pending[f"after#{self.next_id}"] = (func, args)
+        return f"after#{self.next_id}"
+
+    def after_idle(self, func, *args):
+        return self.after(0, func, *args)
+
+    def after_cancel(self, after_id):
+        self.pending.pop(after_id, None)
+
+    def run_pending(self):
+        pending, self.pending = self.pending, {}
+        for func, args in pending.values():
+            func(*args)
+
+class StubModule:
+    """替代 tkinter 模組：常數為小寫字串 (tk.END -> 'end')，其他名稱皆為元件替身"""
+
+    def __init__(self, **classes):
+        self.classes = classes
+
+    def __getattr__(self, name):
+        if name in self.classes:
+            return self.classes[name]
+        if name.isupper():
+            return name.lower()
+        return StubWidget
+
+class StubDialogs:
+    """messagebox / filedialog 替身：確認一律為是、錯誤訊息改為例外，檔案路徑由基準測試指定"""
+
+    def __init__(self):
+        self.path = ''
+
+    def askyesno(self, *args, **kwargs):
+        return True
+
+    def asksaveasfilename(self, *args, **kwargs):
+        return self.path
+
+    askopenfilename = askdirectory = asksaveasfilename
+
+    def showerror(self, title, message, **kwargs):
+        # 操作失敗時中止基準測試，避免量測到未完成的操作
+        raise RuntimeError(f"{title}: {message}")
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+#===========================================
+#  Benchmark
+#===========================================
+class SkillTreeBenchmark:
+    """以 SkillTreeManager 的操作流程量測各項功能的執行時間"""
+
+    def __init__(self, work_dir, use_tk=False, repeat=5, edits=50):
+        self.work_dir = work_dir
+        self.use_tk = use_tk
+        self.repeat = repeat
+        self.edits = edits
+        self.results = {}
+        self.dialogs = StubDialogs()
+        # 對話框一律替換，避免等待使用者操作
+        skill_tree11.messagebox = skill_tree11.filedialog = self.dialogs
+        if not use_tk:
+            skill_tree11.tk = StubModule(END='end')
+            skill_tree11.ttk = StubModule(Treeview=StubTreeview)
+            skill_tree11.scrolledtext = StubModule()
+
+    def create_app(self, lazy_load=False):
+        if self.use_tk:
+            root = skill_tree11.tk.Tk()
+            root.withdraw()
+        else:
+            root = StubRoot()
+        app = skill_tree11.SkillTreeManager(root, lazy_load=lazy_load)
+        # 選取事件改由基準測試直接呼叫處理函式，避免真正的 Tk 重複觸發
+        app.tree.unbind('<<TreeviewSelect>>')
+        self.wait(app)
+        return app
+
+    def close_app(self, app):
+        app.db_worker.stop()
+        app.db_worker.thread.join()
+        app.repo.close()
+        if self.use_tk:
+            app.root.destroy()
+
+    def wait(self, app):
+        """處理事件直到背景工作都完成 (真正的 Tk 包含結果輪詢的間隔)"""
+        while True:
+            if self.use_tk:
+                app.root.update()
+            else:
+                app.root.run_pending()
+            if app.pending_tasks == 0:
+                return
+            time.sleep(0.0005)
+
+    def measure(self, name, func, runs):
+        """執行 func() runs 次並記錄每次的時間，runs 小於 1 時引發 ValueError"""
+        if runs < 1:
+            raise ValueError(f"{name} 的執行次數必須大於 0: {runs}")
+        times = []
+        for _ in range(runs):
+            start_time = time.perf_counter()
+            func()
+            times.append((time.perf_counter() - start_time) * 1000)
+        times.sort()
+        self.results[name] = {
+            'runs': len(times),
+            'min_ms': round(times[0], 3),
+            'median_ms': round(statistics.median(times), 3),
+            'mean_ms': round(statistics.mean(times), 3),
+            'p95_ms': round(skill_db.percentile(times, 95), 3),
+            'max_ms': round(times[-1], 3),
+        }
+        print(f"[基準] {name:<14} {len(times):4d} 次 | 中位數 {self.results[name]['median_ms']:.3f}ms, "
+              f"最大 {self.results[name]['max_ms']:.3f}ms", file=sys.stderr)
+
+    def nodes(self, app, kind):
+        return [node for node, info in app.node_info.items() if info.kind == kind]
+
+    def select(self, app, node):
+        app.tree.selection_set(node)
+        app.on_tree_select(None)
+
+    def run(self):
+        # 載入：每次建立新的 SkillTreeManager，直到整棵樹建立完成
+        self.measure('load', lambda: self.close_app(self.create_app()), self.repeat)
+        self.measure('load_lazy', lambda: self.close_app(self.create_app(lazy_load=True)), self.repeat)
+
+        app = self.create_app()
+        try:
+            self.run_queries(app)
+            self.run_exports(app)
+            self.run_edits(app)
+            self.run_import(app)
+        finally:
+            self.close_app(app)
+        return self.results
+
+    def run_queries(self, app):
+        year_nodes = itertools.cycle(self.nodes(app, 'year'))
+        self.measure('select', lambda: self.select(app, next(year_nodes)), self.edits)
+
+        category = next(iter(app.skill_types))
+        app.search_category_combobox.set(category)
+        app.on_search_category_selected(None)
+        app.search_year_entry.set('2020')
+        app.search_year_to_entry.set('2030')
+
+        def search():
+            app.perform_search()
+            self.wait(app)
+
+        def aggregate():
+            app.perform_aggregate()
+            self.wait(app)
+
+        def fulltext():
+            app.fulltext_entry.delete(0, 'end')
+            app.fulltext_entry.insert(0, skill_db.GENERATE_PROJECTS[0])
+            app.perform_fulltext_search()
+            self.wait(app)
+
+        self.measure('search', search, self.repeat)
+        self.measure('aggregate', aggregate, self.repeat)
+        self.measure('fulltext', fulltext, self.repeat)
+
+    def run_exports(self, app):
+        def export(name, method, path):
+            def run():
+                self.dialogs.path = path
+                method()
+                self.wait(app)
+            self.measure(name, run, self.repeat)
+
+        self.json_path = os.path.join(self.work_dir, 'export.json')
+        export('export_json', app.export_json, self.json_path)
+        export('export_mm', app.export_mm_all, os.path.join(self.work_dir, 'export.mm'))
+        export('export_mm_dir', app.export_mm_batch, os.path.join(self.work_dir, 'mm'))
+
+    def run_edits(self, app):
+        # 新增：選取人員後新增一筆新技能 (含分類、技能、年份節點)
+        person_nodes = itertools.cycle(self.nodes(app, 'person'))
+        counter = iter(range(self.edits))
+
+        def add():
+            self.select(app, next(person_nodes))
+            app.category_combobox.set('基準測試')
+            app.skill_combobox.set(f"技能{next(counter)}")
+            app.year_entry.delete(0, 'end')
+            app.year_entry.insert(0, '2030H1')
+            app.level_spinbox.set('3')
+            app.add_skill()
+
+        # 更新：選取年份節點後修改等級與經驗
+        year_nodes = itertools.cycle(self.nodes(app, 'year'))
+
+        def update():
+            self.select(app, next(year_nodes))
+            app.level_spinbox.delete(0, 'end')
+            app.level_spinbox.insert(0, '5')
+            app.experience_text.delete('1.0', 'end')
+            app.experience_text.insert('1.0', '基準測試更新')
+            app.update_skill()
+
+        # 刪除：選取年份節點後刪除
+        delete_nodes = iter(self.nodes(app, 'year')[::-1])
+
+        def delete():
+            app.tree.selection_set(next(delete_nodes))
+            app.delete_selected()
+
+        self.measure('add', add, self.edits)
+        self.measure('update', update, self.edits)
+        self.measure('delete', delete, self.edits)
+
+    def run_import(self, app):
+        # 匯入先前匯出的 JSON：所有人員的技能都會更新，並比對更新樹狀圖
+        def run():
+            self.dialogs.path = self.json_path
+            app.import_json()
+            self.wait(app)
+
+        self.measure('import_json', run, self.repeat)
+
+def git_revision():
+    """目前的 git commit，不是 git 工作目錄時回傳 None"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="技能樹管理系統效能基準測試")
+    parser.add_argument('--persons', type=skill_db.positive_int, default=500, help="人員數 (預設 500)")
+    parser.add_argument('--categories', type=int, help="分類數 (預設為技能類型定義的分類數)")
+    parser.add_argument('--skills', type=int, help="每個分類的技能數 (預設為定義的技能數)")
+    parser.add_argument('--periods', type=int, default=10, help="半年期間數 (預設 10)")
+    parser.add_argument('--coverage', type=float, default=0.5, help="每位人員擁有各技能的機率")
+    parser.add_argument('--seed', type=int, default=0, help="亂數種子")
+    parser.add_argument('--catalog', default='skill_type.json', help="技能類型定義檔")
+    parser.add_argument('--repeat', type=skill_db.positive_int, default=5,
+                        help="載入、查詢、匯入匯出的執行次數")
+    parser.add_argument('--edits', type=skill_db.positive_int, default=50, help="選取、新增、更新、刪除的次數")
+    parser.add_argument('--tk', action='store_true', help="使用真正的 Tk (需要顯示器或 xvfb-run)")
+    parser.add_argument('--output', help="將結果附加為一行 JSON 到此檔案")
+    args = parser.parse_args(argv)
+
+    catalog = skill_db.load_skill_catalog(args.catalog)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        # SkillTreeManager 從目前目錄讀取 skills.db 與 skill_type.json
+        shutil.copy(args.catalog, os.path.join(work_dir, 'skill_type.json'))
+        os.chdir(work_dir)
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                conn = skill_db.connect_database('skills.db')
+                skill_db.create_schema(conn)
+                persons, skills = skill_db.generate_database(
+                    conn, args.persons, catalog, args.categories, args.skills, args.periods,
+                    coverage=args.coverage, seed=args.seed)
+                conn.close()
+                results = SkillTreeBenchmark(work_dir, args.tk, args.repeat, args.edits).run()
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'mode': 'tk' if args.tk else 'stub',
+        'dataset': {
+            'persons': persons,
+            'skills': skills,
+            'categories': args.categories,
+            'skills_per_category': args.skills,
+            'periods': args.periods,
+            'coverage': args.coverage,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    line = json.dumps(report, ensure_ascii=False)
+    print(line)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2139 @@
+"""技能資料庫的資料存取層與命令列工具
+
+不匯入 tkinter，可供排程工作或沒有圖形介面的伺服器直接使用:
+
+    python skill_db.py import skills.json
+    python skill_db.py export skills.json --compact
+    python skill_db.py export-mm skills.mm
+    python skill_db.py export-mm --dir mm_files
+    python skill_db.py search --category 程式設計 --skill Python --from 2022H1 --to 2025H2 --min-level 4
+    python skill_db.py search --text Kubernetes
+    python skill_db.py stats --group-by category,period
+    python skill_db.py --db bench.db generate --persons 2000 --periods 12
+    python skill_db.py cleanup --vacuum
+    python skill_db.py cleanup --duplicates
+    python skill_db.py benchmark-profiles --edits 500
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# 預設的資料庫檔案
+DEFAULT_DB_PATH = 'skills.db'
+
+# 預設的技能類型定義檔
+DEFAULT_CATALOG_PATH = 'skill_type.json'
+
+# 匯入 JSON 時每批以 executemany 寫入的技能資料筆數
+IMPORT_BATCH_SIZE = 5000
+
+# 資料庫連線設定，開啟連線時套用
+# WAL 模式讀寫不互相阻擋，但需要所有連線在同一台主機上 (共用記憶體)，
+# 網路磁碟上不支援。skills.db 可能放在多人共用的網路磁碟，因此預設為 legacy，
+# 確定資料庫在本機磁碟時再以 SKILLS_DB_PROFILE=wal 或 --db-profile wal 啟用
+CONNECTION_PROFILES = {
+    # 舊版預設值：rollback journal，每次 commit 都完整 fsync
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'cache_size': -2000,        # KiB
+        'mmap_size': 0,
+        'busy_timeout': 5000,       # 毫秒
+    },
+    # WAL + synchronous=NORMAL：commit 只寫入 WAL，checkpoint 時才 fsync
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -20000,
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 5000,
+    },
+}
+DEFAULT_CONNECTION_PROFILE = os.environ.get('SKILLS_DB_PROFILE', 'legacy')
+
+# 每個連線快取的已編譯 SQL 敘述數量 (sqlite3 預設 128)。
+# Repository 的 SQL 都是固定字串，快取夠大就不會被擠出而重新編譯
+STATEMENT_CACHE_SIZE = 256
+
+# 全文搜尋最多回傳的筆數
+FTS_RESULT_LIMIT = 200
+# trigram 索引可比對的最短關鍵字長度，關鍵字都比這短時改為逐筆比對
+FTS_MIN_TERM_LENGTH = 3
+# 逐筆比對結果的摘要在關鍵字前後保留的字數
+SCAN_SNIPPET_CONTEXT = 16
+
+# 重新整理人員節點時，每次 id IN (...) 查詢的人員數
+PERSON_ID_CHUNK_SIZE = 500
+
+# 編輯記錄最多保留幾個可復原的操作
+JOURNAL_UNDO_LIMIT = 100
+# 編輯記錄讀取修改後內容時，每次 id IN (...) 查詢的 id 數量
+JOURNAL_ID_CHUNK_SIZE = 500
+
+def period_sort_key(year_period):
+    """將年份期間轉為可排序的整數 (年*10+半年)，例: 2025H1 -> 20251，2025 -> 20250
+
+    無法解析時回傳 None
+    """
+    text = (year_period or '').strip().upper()
+    half = 0
+    if text.endswith('H1'):
+        half = 1
+        text = text[:-2]
+    elif text.endswith('H2'):
+        half = 2
+        text = text[:-2]
+    if not text.isdigit():
+        return None
+    return int(text) * 10 + half
+
+def connect_database(db_path, profile=None, cached_statements=STATEMENT_CACHE_SIZE,
+                     foreign_keys=True):
+    """開啟資料庫連線並套用連線設定，profile 可為 CONNECTION_PROFILES 的名稱或設定 dict
+
+    foreign_keys 為 True 時強制外鍵，刪除人員時由 ON DELETE CASCADE 一併刪除其技能
+    """
+    if profile is None:
+        profile = DEFAULT_CONNECTION_PROFILE
+    if isinstance(profile, str):
+        profile = CONNECTION_PROFILES[profile]
+
+    conn = sqlite3.connect(db_path, cached_statements=cached_statements)
+    # busy_timeout 要最先設定，切換 journal_mode 時可能需要等待其他連線
+    conn.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout'])}")
+    conn.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+    conn.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+    conn.execute(f"PRAGMA cache_size = {int(profile['cache_size'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])}")
+    conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+    return conn
+
+# 效能分析用：callable(sql, 秒數)，由 set_query_observer 設定，
+# repository 與匯入、匯出、全文搜尋等直接使用連線的函式共用
+_query_observer = None
+
+def set_query_observer(observer):
+    """設定 (或以 None 取消) 每次查詢後呼叫的 observer(sql, 秒數)
+
+    可能在背景執行緒中被呼叫
+    """
+    global _query_observer
+    _query_observer = observer
+
+def observe_query(sql, statement):
+    """執行 statement()；有設定 query observer 時記錄執行時間 (含讀取結果)
+
+    逐列讀取的游標 (匯出) 只計入取得第一列之前的時間，其餘時間含在 [匯出] 的總計內
+    """
+    if _query_observer is None:
+        return statement()
+    start_time = time.perf_counter()
+    try:
+        return statement()
+    finally:
+        _query_observer(sql, time.perf_counter() - start_time)
+
+@contextlib.contextmanager
+def transaction(conn):
+    """以單一交易執行區塊內的修改，發生例外 (含取消) 時回滾"""
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+def create_schema(conn):
+    """建立基本資料表，並套用尚未執行的 schema migration"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS persons (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS skills (
+            id INTEGER PRIMARY KEY,
+            person_id INTEGER,
+            skill_category TEXT,
+            skill_name TEXT,
+            year_period TEXT,
+            skill_level INTEGER,
+            experience TEXT,
+            FOREIGN KEY (person_id) REFERENCES persons(id) ON DELETE CASCADE
+        )
+    ''')
+    conn.commit()
+
+    # 之後新增的欄位與索引由 migrate_database 依版本加入，
+    # 既有資料庫也會在啟動時自動升級到最新的 schema 版本
+    migrate_database(conn)
+
+def percentile(sorted_values, percent):
+    """以 nearest-rank 法取已排序資料的百分位數，例如 percentile(values, 95) 為 p95
+
+    取第 ceil(percent / 100 * n) 小的值 (以整數計算，避免浮點誤差)
+    """
+    return sorted_values[max(0, -(-len(sorted_values) * percent // 100) - 1)]
+
+def benchmark_connection_profiles(edits=200, profiles=None):
+    """比較各連線設定下，單筆編輯 (UPDATE + commit) 的延遲
+
+    在暫存目錄建立測試資料庫，不會動到 skills.db；回傳 {設定名稱: 統計結果}，
+    edits 小於 1 時引發 ValueError
+    """
+    if edits < 1:
+        raise ValueError(f"編輯次數必須大於 0: {edits}")
+    results = {}
+    for name in profiles or CONNECTION_PROFILES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = connect_database(os.path.join(tmp_dir, 'benchmark.db'), name)
+            create_schema(conn)
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO persons (name) VALUES ('benchmark')")
+            person_id = cursor.lastrowid
+            cursor.executemany("""
+                INSERT INTO skills (person_id, skill_category, skill_name, year_period, period_key, skill_level, experience)
+                VALUES (?, 'benchmark', ?, '2025H1', 20251, 0, '')
+            """, [(person_id, f"skill{i}") for i in range(edits)])
+            conn.commit()
+            row_ids = [row[0] for row in cursor.execute("SELECT id FROM skills")]
+
+            # 模擬 update_skill：每次編輯更新一筆並立即 commit
+            latencies = []
+            for i, row_id in enumerate(row_ids):
+                start_time = time.perf_counter()
+                cursor.execute("UPDATE skills SET skill_level = ?, experience = ? WHERE id = ?",
+                               (i % 6, f"edit {i}", row_id))
+                conn.commit()
+                latencies.append((time.perf_counter() - start_time) * 1000)
+            conn.close()
+
+        latencies.sort()
+        results[name] = {
+            'edits': len(latencies),
+            'mean_ms': statistics.mean(latencies),
+            'median_ms': statistics.median(latencies),
+            'p95_ms': percentile(latencies, 95),
+            'max_ms': latencies[-1],
+        }
+        print(f"[效能] {name:<8} {len(latencies)} 次編輯 | "
+              f"平均 {results[name]['mean_ms']:.3f}ms, "
+              f"中位數 {results[name]['median_ms']:.3f}ms, "
+              f"p95 {results[name]['p95_ms']:.3f}ms, "
+              f"最大 {results[name]['max_ms']:.3f}ms")
+    return results
+
+#===========================================
+#  Schema migration
+#===========================================
+class DuplicateSkillsError(ValueError):
+    """資料庫有重複的 (人員, 分類, 技能, 年份)，需先執行 cleanup --duplicates 才能升級 schema"""
+
+    def __init__(self, duplicates, total):
+        self.duplicates = duplicates
+        self.total = total
+        lines = [f"  {name} / {category} / {skill_name} / {year_period}: {count} 筆"
+                 for name, category, skill_name, year_period, count in duplicates]
+        if total > len(duplicates):
+            lines.append(f"  ... 共 {total} 組")
+        super().__init__(
+            "技能資料有重複的 (人員, 分類, 技能, 年份)，各組可能有不同的等級或經驗:\n"
+            + "\n".join(lines)
+            + "\n請確認後執行 python skill_db.py cleanup --duplicates (只保留每組最後寫入的一筆)")
+
+# 重複的 (人員, 分類, 技能, 年份) 最多列出幾組
+DUPLICATE_LIST_LIMIT = 10
+
+def find_duplicate_skills(conn, limit=None):
+    """回傳 ([(姓名, 分類, 技能, 年份, 筆數), ...], 重複的組數)，limit 限制列出的組數"""
+    rows = conn.execute("""
+        SELECT COALESCE(p.name, '(人員 ' || s.person_id || ')'), s.skill_category, s.skill_name,
+               s.year_period, COUNT(*)
+        FROM skills s
+        LEFT JOIN persons p ON p.id = s.person_id
+        GROUP BY s.person_id, s.skill_category, s.skill_name, s.year_period
+        HAVING COUNT(*) > 1
+        ORDER BY s.person_id, s.skill_category, s.skill_name, s.year_period
+    """).fetchall()
+    return (rows if limit is None else rows[:limit]), len(rows)
+
+def delete_duplicate_skills(conn):
+    """刪除重複的 (人員, 分類, 技能, 年份)，每組只保留最後寫入的一筆，回傳刪除筆數
+
+    只在 cleanup --duplicates 明確要求時執行；schema 升級遇到重複資料時會停止而不自動刪除
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'skills'").fetchone() is None:
+        return 0
+    duplicates, total = find_duplicate_skills(conn)
+    for name, category, skill_name, year_period, count in duplicates:
+        print(f"[清理] {name} / {category} / {skill_name} / {year_period}: 保留 1 筆, 刪除 {count - 1} 筆")
+    with transaction(conn):
+        deleted = conn.execute("""
+            DELETE FROM skills
+            WHERE id NOT IN (
+                SELECT MAX(id) FROM skills
+                GROUP BY person_id, skill_category, skill_name, year_period
+            )
+        """).rowcount
+    print(f"[清理] 刪除 {deleted} 筆重複的技能資料 ({total} 組)")
+    return deleted
+
+def migrate_v1_skill_indexes(conn):
+    """skills 表加上自然鍵唯一索引與查詢用索引
+
+    舊資料有重複的 (人員, 分類, 技能, 年份) 時引發 DuplicateSkillsError，不自動刪除
+    """
+    cursor = conn.cursor()
+
+    duplicates, total = find_duplicate_skills(conn, DUPLICATE_LIST_LIMIT)
+    if duplicates:
+        raise DuplicateSkillsError(duplicates, total)
+
+    # 自然鍵唯一索引，同時支援以人員為前綴的查詢
+    # (person_id) / (person_id, 分類) / (person_id, 分類, 技能) / 完整鍵
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_skills_person_key
+        ON skills (person_id, skill_category, skill_name, year_period)
+    """)
+    # 查詢分頁：依分類、技能名稱、年份搜尋
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_skills_search
+        ON skills (skill_category, skill_name, year_period)
+    """)
+
+def migrate_v2_period_key(conn):
+    """skills 表加上整數排序鍵 period_key，取代字串 CASE 排序"""
+    cursor = conn.cursor()
+    cursor.execute("ALTER TABLE skills ADD COLUMN period_key INTEGER")
+
+    # 以 Python 函式回填既有資料
+    conn.create_function("period_sort_key", 1, period_sort_key, deterministic=True)
+    cursor.execute("UPDATE skills SET period_key = period_sort_key(year_period)")
+
+    # 依人員、分類、技能、年份順序的掃描可直接走索引，不需額外排序
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_skills_person_period
+        ON skills (person_id, skill_category, skill_name, period_key, year_period)
+    """)
+
+def migrate_v3_experience_fts(conn):
+    """建立技能經驗的 FTS5 全文索引，並以 trigger 與 skills 表保持同步"""
+    cursor = conn.cursor()
+
+    # trigram 斷詞可搜尋中文等沒有空白分隔的文字 (需 SQLite 3.34 以上)，
+    # 舊版 SQLite 改用 unicode61
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE skills_fts USING fts5(
+                experience, content='skills', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE skills_fts USING fts5(
+                experience, content='skills', content_rowid='id'
+            )
+        """)
+
+    cursor.execute("""
+        CREATE TRIGGER skills_fts_insert AFTER INSERT ON skills BEGIN
+            INSERT INTO skills_fts (rowid, experience) VALUES (new.id, new.experience);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER skills_fts_delete AFTER DELETE ON skills BEGIN
+            INSERT INTO skills_fts (skills_fts, rowid, experience)
+            VALUES ('delete', old.id, old.experience);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER skills_fts_update AFTER UPDATE OF experience ON skills BEGIN
+            INSERT INTO skills_fts (skills_fts, rowid, experience)
+            VALUES ('delete', old.id, old.experience);
+            INSERT INTO skills_fts (rowid, experience) VALUES (new.id, new.experience);
+        END
+    """)
+
+    # 為既有資料建立索引
+    cursor.execute("INSERT INTO skills_fts (skills_fts) VALUES ('rebuild')")
+
+def migrate_v4_range_index(conn):
+    """查詢分頁改以 period_key 範圍與等級條件查詢，換成可涵蓋查詢與統計的索引"""
+    cursor = conn.cursor()
+
+    # 分類、技能為等值條件，period_key 為範圍條件，等級與人員只在索引內比對/計數，
+    # 範圍查詢與 GROUP BY 分類/技能/期間的統計都不必回表
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_skills_range
+        ON skills (skill_category, skill_name, period_key, skill_level, person_id)
+    """)
+    # 單一年份查詢也改走 period_key，舊索引已被取代
+    cursor.execute("DROP INDEX IF EXISTS idx_skills_search")
+
+def migrate_v5_cascade_delete(conn):
+    """skills.person_id 改為 ON DELETE CASCADE，刪除人員時由 SQLite 一併刪除其技能
+
+    SQLite 無法修改既有的外鍵，依官方建議的步驟重建資料表：
+    複製資料到新表、刪除舊表、改名，再重建原有的索引與 trigger (skills.id 不變，全文索引仍有效)
+    """
+    cursor = conn.cursor()
+    definitions = [row[0] for row in cursor.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name = 'skills' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    """)]
+    cursor.execute("""
+        CREATE TABLE skills_new (
+            id INTEGER PRIMARY KEY,
+            person_id INTEGER,
+            skill_category TEXT,
+            skill_name TEXT,
+            year_period TEXT,
+            skill_level INTEGER,
+            experience TEXT,
+            period_key INTEGER,
+            FOREIGN KEY (person_id) REFERENCES persons(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO skills_new
+        (id, person_id, skill_category, skill_name, year_period, skill_level, experience, period_key)
+        SELECT id, person_id, skill_category, skill_name, year_period, skill_level, experience, period_key
+        FROM skills
+    """)
+    cursor.execute("DROP TABLE skills")
+    cursor.execute("ALTER TABLE skills_new RENAME TO skills")
+    for sql in definitions:
+        cursor.execute(sql)
+
+    # 既有的孤兒技能 (人員已不存在) 不會被自動刪除，以 cleanup 指令清除
+    orphans = cursor.execute("SELECT COUNT(*) FROM pragma_foreign_key_check('skills')").fetchone()[0]
+    if orphans:
+        print(f"[資料庫] 有 {orphans} 筆技能資料的人員已不存在，"
+              f"可執行 python skill_db.py cleanup 清除")
+
+# (版本, 說明, 升級函式)，依版本順序套用，只能往後新增
+SCHEMA_MIGRATIONS = [
+    (1, "skills 索引與唯一鍵", migrate_v1_skill_indexes),
+    (2, "skills 年份排序鍵 period_key", migrate_v2_period_key),
+    (3, "技能經驗全文搜尋 skills_fts", migrate_v3_experience_fts),
+    (4, "範圍查詢與統計索引 idx_skills_range", migrate_v4_range_index),
+    (5, "刪除人員時連帶刪除技能 (ON DELETE CASCADE)", migrate_v5_cascade_delete),
+]
+
+def migrate_database(conn):
+    """依 PRAGMA user_version 套用尚未執行的 schema migration"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_MIGRATIONS[-1][0]:
+        return version
+
+    # 重建資料表時外鍵必須暫時關閉 (交易中無法切換)，升級完成後恢復
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for target_version, description, migrate in SCHEMA_MIGRATIONS:
+            if version >= target_version:
+                continue
+            with transaction(conn):
+                migrate(conn)
+                conn.execute(f"PRAGMA user_version = {target_version}")
+            version = target_version
+            print(f"[資料庫] 已升級至第 {target_version} 版: {description}")
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+
+    return version
+
+def delete_orphan_skills(conn, vacuum=False):
+    """刪除人員已不存在 (或沒有人員) 的技能資料，回傳刪除筆數
+
+    啟用 ON DELETE CASCADE 之前手動刪除人員時可能留下這些資料；vacuum 為 True 時釋放檔案空間
+    """
+    start_time = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute("""
+        DELETE FROM skills
+        WHERE person_id IS NULL OR person_id NOT IN (SELECT id FROM persons)
+    """)
+    deleted = cursor.rowcount
+    conn.commit()
+    # 刪除大量資料後更新查詢規劃的統計資訊
+    conn.execute("PRAGMA optimize")
+    if vacuum:
+        conn.execute("VACUUM")
+    print(f"[清理] 刪除 {deleted} 筆孤兒技能資料 | 總計 {time.perf_counter() - start_time:.3f}s")
+    return deleted
+
+#===========================================
+#  Full-text search
+#===========================================
+def search_experience(conn, text, limit=FTS_RESULT_LIMIT):
+    """以全文索引搜尋技能經驗，依相關程度排序
+
+    多個關鍵字以空白分隔，需全部符合；回傳
+    [(姓名, 分類, 技能名稱, 年份, 等級, 摘要), ...]
+    trigram 索引下所有關鍵字都少於 FTS_MIN_TERM_LENGTH 個字時無法使用索引，
+    改由 scan_experience 逐筆比對
+    """
+    terms = text.split()
+    if not terms:
+        return []
+
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'skills_fts'").fetchone()[0]
+    short_terms = []
+    if 'trigram' in sql:
+        # trigram 索引無法比對少於 3 個字的關鍵字，這些關鍵字只用來過濾索引找到的資料
+        short_terms = [term for term in terms if len(term) < FTS_MIN_TERM_LENGTH]
+        terms = [term for term in terms if len(term) >= FTS_MIN_TERM_LENGTH]
+        if not terms:
+            return scan_experience(conn, text, limit)
+
+    # 每個關鍵字當作一個片語，避免使用者輸入被解讀為 FTS 查詢語法
+    query = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+    where = "".join(" AND s.experience LIKE ? ESCAPE '\\'" for _ in short_terms)
+    # 對所有符合資料計算 rank，LIMIT 讓排序只保留前幾筆
+    ranked_sql = f"""
+        SELECT p.name, s.skill_category, s.skill_name, s.year_period, s.skill_level,
+               snippet(skills_fts, 0, '[', ']', '...', 16)
+        FROM skills_fts
+        JOIN skills s ON s.id = skills_fts.rowid
+        JOIN persons p ON p.id = s.person_id
+        WHERE skills_fts MATCH ?{where}
+        ORDER BY rank
+        LIMIT ?
+    """
+    params = (query, *(like_pattern(term) for term in short_terms), limit)
+    return observe_query(ranked_sql, lambda: conn.execute(ranked_sql, params).fetchall())
+
+def scan_experience(conn, text, limit=FTS_RESULT_LIMIT):
+    """不使用索引，以 LIKE 逐筆比對技能經驗 (不分大小寫)，由新到舊排列
+
+    用於 trigram 索引無法搜尋的短關鍵字 (例如 Go、AI、測試)。需掃描整個 skills 表，
+    不計算相關程度；回傳格式與 search_experience 相同，摘要標示第一個關鍵字
+    """
+    terms = text.split()
+    if not terms:
+        return []
+
+    where = " AND ".join("s.experience LIKE ? ESCAPE '\\'" for _ in terms)
+    sql = f"""
+        SELECT p.name, s.skill_category, s.skill_name, s.year_period, s.skill_level, s.experience
+        FROM skills s
+        JOIN persons p ON p.id = s.person_id
+        WHERE {where}
+        ORDER BY s.id DESC
+        LIMIT ?
+    """
+    params = (*(like_pattern(term) for term in terms), limit)
+    rows = observe_query(sql, lambda: conn.execute(sql, params).fetchall())
+    return [(*row[:5], scan_snippet(row[5], terms[0])) for row in rows]
+
+def like_pattern(term):
+    """將關鍵字轉為 LIKE ... ESCAPE '\\' 的包含比對樣式"""
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def scan_snippet(experience, term):
+    """擷取關鍵字前後 SCAN_SNIPPET_CONTEXT 個字，並以 [ ] 標示關鍵字 (與 snippet() 格式相同)"""
+    start = experience.lower().find(term.lower())
+    if start < 0:
+        return experience
+    end = start + len(term)
+    left = max(start - SCAN_SNIPPET_CONTEXT, 0)
+    right = min(end + SCAN_SNIPPET_CONTEXT, len(experience))
+    return ("..." if left else "") + experience[left:start] + \
+        "[" + experience[start:end] + "]" + experience[end:right] + \
+        ("..." if right < len(experience) else "")
+
+#===========================================
+#  Range and aggregate queries
+#===========================================
+# 統計可用的分組欄位：名稱 -> (顯示名稱, 分組欄位)
+# 期間以 period_key 分組，才能直接依 idx_skills_range 的順序彙總
+AGGREGATE_GROUPS = {
+    'category': ("分類", "s.skill_category"),
+    'skill': ("技能", "s.skill_name"),
+    'period': ("期間", "s.period_key"),
+}
+
+def period_range_bounds(period_from=None, period_to=None):
+    """將年份範圍轉為 period_key 的上下限，只填年份時包含整年 (H1、H2)
+
+    未填的一端回傳 None，無法解析時引發 ValueError
+    """
+    lower = upper = None
+    if period_from:
+        lower = period_sort_key(period_from)
+        if lower is None:
+            raise ValueError(f"無法解析的年份期間: {period_from}")
+    if period_to:
+        upper = period_sort_key(period_to)
+        if upper is None:
+            raise ValueError(f"無法解析的年份期間: {period_to}")
+        if upper % 10 == 0:
+            upper += 9
+    return lower, upper
+
+def format_period_key(period_key):
+    """period_sort_key 的反向轉換，例: 20251 -> 2025H1，20250 -> 2025"""
+    if period_key is None:
+        return ""
+    year, half = divmod(period_key, 10)
+    return f"{year}H{half}" if half else str(year)
+
+def build_skill_filter(category=None, skill_name=None, period_from=None, period_to=None,
+                       min_level=None, max_level=None):
+    """依查詢條件組出 skills (別名 s) 的 WHERE 子句與參數，未填的條件不限制
+
+    人員已刪除、尚未執行 cleanup 的技能資料一律排除，讓筆數、查詢與統計結果一致
+    """
+    clauses = ["s.person_id IN (SELECT id FROM persons)"]
+    params = []
+    if category:
+        clauses.append("s.skill_category = ?")
+        params.append(category)
+    if skill_name:
+        clauses.append("s.skill_name = ?")
+        params.append(skill_name)
+
+    lower, upper = period_range_bounds(period_from, period_to)
+    if lower is not None:
+        clauses.append("s.period_key >= ?")
+        params.append(lower)
+    if upper is not None:
+        clauses.append("s.period_key <= ?")
+        params.append(upper)
+
+    if min_level is not None:
+        clauses.append("s.skill_level >= ?")
+        params.append(min_level)
+    if max_level is not None:
+        clauses.append("s.skill_level <= ?")
+        params.append(max_level)
+
+    return " AND ".join(clauses), params
+
+def search_skills(conn, limit=None, offset=0, **criteria):
+    """依條件查詢技能資料，回傳 [(姓名, 分類, 技能名稱, 年份, 等級, 經驗), ...]
+
+    criteria 同 build_skill_filter 的參數；指定 limit 時只取 offset 起的一頁
+    """
+    where, params = build_skill_filter(**criteria)
+    sql = f"""
+        SELECT p.name, s.skill_category, s.skill_name, s.year_period, s.skill_level, s.experience
+        FROM skills s
+        JOIN persons p ON p.id = s.person_id
+        WHERE {where}
+        ORDER BY s.skill_category, s.skill_name, s.period_key, p.name
+    """
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    return observe_query(sql, lambda: conn.execute(sql, params).fetchall())
+
+def count_skills(conn, **criteria):
+    """計算符合條件的技能資料筆數，只掃描 skills 的涵蓋索引與 persons 主鍵，不需回表"""
+    where, params = build_skill_filter(**criteria)
+    sql = f"SELECT COUNT(*) FROM skills s WHERE {where}"
+    return observe_query(sql, lambda: conn.execute(sql, params).fetchone()[0])
+
+def aggregate_skills(conn, group_by, **criteria):
+    """依分組欄位統計人數、平均等級與最高等級，全部在 SQL 內計算
+
+    group_by 為 AGGREGATE_GROUPS 的名稱清單，回傳
+    [(分組欄位..., 人數, 平均等級, 最高等級), ...]
+    """
+    if not group_by:
+        raise ValueError("請至少選擇一個分組欄位")
+    group_columns = ", ".join(AGGREGATE_GROUPS[name][1] for name in group_by)
+
+    where, params = build_skill_filter(**criteria)
+    sql = f"""
+        SELECT {group_columns},
+               COUNT(DISTINCT s.person_id), ROUND(AVG(s.skill_level), 2), MAX(s.skill_level)
+        FROM skills s
+        WHERE {where}
+        GROUP BY {group_columns}
+        ORDER BY {group_columns}
+    """
+    rows = observe_query(sql, lambda: conn.execute(sql, params).fetchall())
+
+    if 'period' not in group_by:
+        return rows
+    index = group_by.index('period')
+    return [row[:index] + (format_period_key(row[index]),) + row[index + 1:] for row in rows]
+
+#===========================================
+#  JSON streaming
+#===========================================
+def iter_json_object_items(f, chunk_size=1 << 16):
+    """逐段讀取最外層為物件的 JSON 檔，依序產生 (key, value)
+
+    每次只保留目前這一筆 value 所需的內容，不會一次載入整個檔案。
+    與 json.load 相同，結尾的 } 之後只能有空白；錯誤的位置為整個檔案中的行、列與字元位置
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    # 已從緩衝區捨棄的字元數、換行數，以及捨棄部分最後一行的長度
+    dropped_chars = 0
+    dropped_lines = 0
+    dropped_column = 0
+
+    def fill():
+        nonlocal buffer, pos, eof, dropped_chars, dropped_lines, dropped_column
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        newlines = buffer.count('\n', 0, pos)
+        if newlines:
+            dropped_lines += newlines
+            dropped_column = pos - buffer.rindex('\n', 0, pos) - 1
+        else:
+            dropped_column += pos
+        dropped_chars += pos
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def error(message, at):
+        """以檔案中的位置建立 JSONDecodeError (at 為緩衝區內的位置)"""
+        newlines = buffer.count('\n', 0, at)
+        lineno = dropped_lines + newlines + 1
+        if newlines:
+            colno = at - buffer.rindex('\n', 0, at)
+        else:
+            colno = dropped_column + at + 1
+        e = json.JSONDecodeError(message, buffer, at)
+        e.pos, e.lineno, e.colno = dropped_chars + at, lineno, colno
+        e.args = (f"{message}: line {lineno} column {colno} (char {e.pos})",)
+        return e
+
+    def next_char():
+        """略過空白並回傳下一個字元，檔案結束時回傳空字串"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                return ''
+            fill()
+
+    def decode():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise error(e.msg, e.pos) from None
+                fill()
+                continue
+            # 數字等值可能剛好在緩衝區結尾被截斷 (例如 "2." 只解析出 2)，
+            # 後面不是合法的分隔字元時需要讀入更多內容再解析
+            if not eof and (end == len(buffer) or buffer[end] not in ' \t\r\n,:]}'):
+                fill()
+                continue
+            pos = end
+            return value
+
+    def expect(char):
+        nonlocal pos
+        if next_char() != char:
+            raise error(f"Expecting '{char}'", pos)
+        pos += 1
+
+    def expect_end():
+        nonlocal pos
+        pos += 1
+        if next_char():
+            raise error("Extra data", pos)
+
+    expect('{')
+    if next_char() == '}':
+        expect_end()
+        return
+    while True:
+        if next_char() != '"':
+            raise error("Expecting property name enclosed in double quotes", pos)
+        key = decode()
+        expect(':')
+        next_char()
+        yield key, decode()
+
+        char = next_char()
+        if char == '}':
+            expect_end()
+            return
+        expect(',')
+
+#===========================================
+#  Database jobs
+#===========================================
+class OperationCancelled(Exception):
+    """背景作業被使用者取消"""
+
+
+# 匯入 JSON 時使用的 SQL
+INSERT_PERSON_SQL = "INSERT INTO persons (name) VALUES (?)"
+UPSERT_SKILL_SQL = """
+    INSERT INTO skills
+    (person_id, skill_category, skill_name, year_period, period_key, skill_level, experience)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (person_id, skill_category, skill_name, year_period) DO UPDATE SET
+        period_key = excluded.period_key,
+        skill_level = excluded.skill_level,
+        experience = excluded.experience
+"""
+
+def import_json_file(conn, file_path, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """串流讀取 JSON 檔，技能資料以 executemany 分批寫入，整個匯入在同一個交易內完成
+
+    progress(message) 於每批寫入後呼叫，可拋出 OperationCancelled 中止匯入
+    回傳有匯入資料的人員 {姓名: persons.id} (依檔案順序)
+    """
+    start_time = time.perf_counter()
+    cursor = conn.cursor()
+    # 一次取得所有人員 ID，匯入時不需逐人查詢
+    sql = "SELECT name, id FROM persons"
+    person_ids = dict(observe_query(sql, lambda: cursor.execute(sql).fetchall()))
+    imported_persons = {}
+    batch = []
+    skill_count = 0
+
+    def flush():
+        nonlocal skill_count
+        # 已存在的 (人員, 分類, 技能, 年份) 直接更新，保留原本的 skills.id
+        observe_query(UPSERT_SKILL_SQL, lambda: cursor.executemany(UPSERT_SKILL_SQL, batch))
+        skill_count += len(batch)
+        batch.clear()
+        if progress:
+            progress(f"匯入中: {len(imported_persons)} 位人員, {skill_count} 筆技能資料")
+
+    # 以單一交易匯入，發生錯誤或取消時回滾
+    with transaction(conn), open(file_path, 'r', encoding='utf-8') as f:
+        for person_name, skills in iter_json_object_items(f):
+            # 新增或取得人員ID
+            person_id = person_ids.get(person_name)
+            if person_id is None:
+                observe_query(INSERT_PERSON_SQL,
+                              lambda: cursor.execute(INSERT_PERSON_SQL, (person_name,)))
+                person_id = person_ids[person_name] = cursor.lastrowid
+            imported_persons[person_name] = person_id
+
+            for skill in skills:
+                batch.append((person_id,
+                              skill['category'],
+                              skill['name'],
+                              skill['year'],
+                              period_sort_key(skill['year']),
+                              skill['level'],
+                              skill['experience']))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+    print(f"[匯入] {len(imported_persons)} 位人員, {skill_count} 筆技能資料 | "
+          f"總計 {time.perf_counter() - start_time:.3f}s")
+    return imported_persons
+
+
+# 匯出時依人員、分類、技能、年份排序的單次掃描
+EXPORT_ROWS_SQL = """
+    SELECT persons.name, skill_category, skill_name, year_period, skill_level, experience
+    FROM persons
+    LEFT JOIN skills ON skills.person_id = persons.id
+    ORDER BY persons.id, skill_category, skill_name, period_key, year_period
+"""
+EXPORT_PERSON_ROWS_SQL = """
+    SELECT persons.name, skill_category, skill_name, year_period, skill_level, experience
+    FROM persons
+    LEFT JOIN skills ON skills.person_id = persons.id
+    WHERE persons.id = ?
+    ORDER BY skill_category, skill_name, period_key, year_period
+"""
+
+def export_json_file(conn, file_path, compact=False, progress=None):
+    """以單次排序掃描讀取所有人員的技能，依人員分組後逐筆寫入檔案
+
+    不在記憶體中組出完整的匯出資料，記憶體用量與資料庫大小無關；
+    compact 為 True 時不縮排。progress(message) 可拋出 OperationCancelled 中止匯出
+    """
+    start_time = time.perf_counter()
+    cursor = conn.cursor()
+
+    # LEFT JOIN 讓沒有技能的人員也會以空陣列匯出
+    observe_query(EXPORT_ROWS_SQL, lambda: cursor.execute(EXPORT_ROWS_SQL))
+
+    # 與 json.dump(indent=2) 相同的排版；精簡模式不含任何空白
+    if compact:
+        indent, separators = None, (',', ':')
+        person_prefix, skill_prefix = '', ''
+    else:
+        indent, separators = 2, None
+        person_prefix, skill_prefix = '\n  ', '\n    '
+    key_separator = ':' if compact else ': '
+
+    def dumps(value):
+        return json.dumps(value, ensure_ascii=False, indent=indent, separators=separators)
+
+    current_person = None
+    person_has_skills = False
+    person_count = 0
+    skill_count = 0
+    try:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('{')
+            # 逐列讀取游標，不使用 fetchall
+            for person_name, category, name, year, level, exp in cursor:
+                if person_name != current_person:
+                    if current_person is not None:
+                        f.write(skill_prefix[:-2] + ']' if person_has_skills else ']')
+                        f.write(',')
+                    f.write(f"{person_prefix}{dumps(person_name)}{key_separator}[")
+                    current_person = person_name
+                    person_has_skills = False
+                    person_count += 1
+                    if progress and person_count % 100 == 0:
+                        progress(f"匯出中: {person_count} 位人員, {skill_count} 筆技能資料")
+
+                # 沒有技能的人員只會有一列 NULL 資料
+                if category is None:
+                    continue
+
+                skill_data = {
+                    "category": category,
+                    "name": name,
+                    "year": year,
+                    "level": level,
+                    "experience": exp if exp else ""
+                }
+                if person_has_skills:
+                    f.write(',')
+                f.write(skill_prefix + dumps(skill_data).replace('\n', skill_prefix))
+                person_has_skills = True
+                skill_count += 1
+
+            if current_person is not None:
+                f.write(skill_prefix[:-2] + ']' if person_has_skills else ']')
+                f.write(person_prefix[:-2] + '}')
+            else:
+                f.write('}')
+    except Exception:
+        # 匯出失敗或取消時不留下不完整的檔案
+        cursor.close()
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+    print(f"[匯出] {person_count} 位人員, {skill_count} 筆技能資料 | "
+          f"總計 {time.perf_counter() - start_time:.3f}s")
+
+# FreeMind 屬性值需跳脫的字元，與 ElementTree 輸出屬性時相同
+# (不使用 xml.sax.saxutils，避免命令列啟動時連帶匯入 urllib)
+MM_ATTRIBUTE_ENTITIES = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+    '\n': '&#10;', '\r': '&#13;', '\t': '&#09;',
+})
+
+def export_mm_file(conn, file_path, person_id=None, progress=None, quiet=False):
+    """以單次排序掃描將技能資料逐段寫成 FreeMind (.mm) 檔，同一技能的各年份合併在同一節點下
+
+    person_id 為 None 時匯出所有人員 (根節點為「技能樹」，其下為各人員)，否則只匯出該人員。
+    不在記憶體中建立 XML 樹，記憶體用量與資料量無關；
+    progress(message) 可拋出 OperationCancelled 中止匯出，quiet 為 True 時不輸出統計
+    """
+    start_time = time.perf_counter()
+    cursor = conn.cursor()
+    if person_id is None:
+        observe_query(EXPORT_ROWS_SQL, lambda: cursor.execute(EXPORT_ROWS_SQL))
+    else:
+        observe_query(EXPORT_PERSON_ROWS_SQL,
+                      lambda: cursor.execute(EXPORT_PERSON_ROWS_SQL, (person_id,)))
+
+    def node(text):
+        return f'<node TEXT="{str(text).translate(MM_ATTRIBUTE_ENTITIES)}"'
+
+    current_person = None
+    current_category = None
+    current_skill = None
+    person_has_children = False
+    person_count = 0
+    skill_count = 0
+
+    try:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n<map version="1.0.1">')
+            if person_id is None:
+                f.write(node("技能樹") + '>')
+
+            # 逐列讀取游標，節點在分組改變時才關閉
+            for person_name, category, skill_name, year, level, exp in cursor:
+                if person_name != current_person:
+                    if current_skill is not None:
+                        f.write('</node>')
+                    if current_category is not None:
+                        f.write('</node>')
+                    if current_person is not None:
+                        f.write('</node>' if person_has_children else ' />')
+                    f.write(node(person_name))
+                    current_person = person_name
+                    current_category = None
+                    current_skill = None
+                    person_has_children = False
+                    person_count += 1
+                    if progress and person_count % 100 == 0:
+                        progress(f"匯出中: {person_count} 位人員, {skill_count} 筆技能資料")
+
+                # 沒有技能的人員只會有一列 NULL 資料
+                if category is None:
+                    continue
+
+                if category != current_category:
+                    if current_skill is not None:
+                        f.write('</node>')
+                    if current_category is not None:
+                        f.write('</node>')
+                    if not person_has_children:
+                        f.write('>')
+                        person_has_children = True
+                    f.write(node(category) + '>')
+                    current_category = category
+                    current_skill = None
+
+                if skill_name != current_skill:
+                    if current_skill is not None:
+                        f.write('</node>')
+                    f.write(node(skill_name) + '>')
+                    current_skill = skill_name
+
+                f.write(node(year) + '>' + node(f"技能等級: {level}") + ' />')
+                if exp:  # 只在有經驗描述時才添加節點
+                    f.write(node(f"技能經驗: {exp}") + ' />')
+                f.write('</node>')
+                skill_count += 1
+
+            if current_skill is not None:
+                f.write('</node>')
+            if current_category is not None:
+                f.write('</node>')
+            if current_person is not None:
+                f.write('</node>' if person_has_children else ' />')
+            if person_id is None:
+                f.write('</node>')
+            f.write('</map>')
+    except Exception:
+        # 匯出失敗或取消時不留下不完整的檔案
+        cursor.close()
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+    if not quiet:
+        print(f"[匯出] FreeMind {person_count} 位人員, {skill_count} 筆技能資料 | "
+              f"總計 {time.perf_counter() - start_time:.3f}s")
+    return person_count, skill_count
+
+# 批次匯出時每個工作交給子行程的人員數
+MM_BATCH_CHUNK_SIZE = 50
+
+# 批次匯出子行程各自的唯讀連線，由 init_mm_export_worker 建立
+_mm_export_conn = None
+
+def mm_file_name(person_name):
+    """人員個別 .mm 檔的檔名，移除檔名不允許的字元"""
+    safe_name = "".join('_' if ch in '\\/:*?"<>|' else ch for ch in person_name)
+    return f"{safe_name}_skills.mm"
+
+def mm_file_names(persons):
+    """批次匯出時每位人員的 .mm 檔名，回傳 [(person_id, 檔名), ...]
+
+    替換字元後相同、或只有大小寫不同 (Windows/macOS 視為同一檔案) 的姓名，
+    檔名加上人員 id 區分，避免後匯出的檔案覆蓋先前的檔案
+    """
+    def key(file_name):
+        return file_name.casefold()
+
+    counts = {}
+    for person_id, person_name in persons:
+        file_key = key(mm_file_name(person_name))
+        counts[file_key] = counts.get(file_key, 0) + 1
+
+    used = set()
+    file_names = []
+    for person_id, person_name in persons:
+        file_name = mm_file_name(person_name)
+        suffix = ""
+        while counts[key(file_name)] > 1 or key(file_name) in used:
+            suffix += f"_{person_id}"
+            file_name = mm_file_name(f"{person_name}{suffix}")
+            counts.setdefault(key(file_name), 0)
+        used.add(key(file_name))
+        file_names.append((person_id, file_name))
+    return file_names
+
+def init_mm_export_worker(db_path):
+    """批次匯出子行程的初始化：開啟唯讀連線，整個行程共用"""
+    global _mm_export_conn
+    _mm_export_conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+def export_mm_chunk(directory, persons):
+    """在子行程中匯出一批 (person_id, 檔名) 的 .mm 檔，回傳 (檔案數, 技能資料筆數)"""
+    skill_count = 0
+    for person_id, file_name in persons:
+        file_path = os.path.join(directory, file_name)
+        skill_count += export_mm_file(_mm_export_conn, file_path, person_id, quiet=True)[1]
+    return len(persons), skill_count
+
+def export_mm_directory(db_path, directory, workers=None, progress=None):
+    """以多個行程平行匯出每位人員各自的 .mm 檔到指定資料夾
+
+    每個子行程使用自己的唯讀連線；progress(message) 可拋出 OperationCancelled，
+    取消時尚未開始的工作不會執行。回傳 (檔案數, 技能資料筆數, 秒數)
+    """
+    # 只有批次匯出需要，延後匯入以免拖慢命令列的啟動時間
+    import concurrent.futures
+    import multiprocessing
+
+    start_time = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        persons = conn.execute("SELECT id, name FROM persons ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    persons = mm_file_names(persons)
+    chunks = [persons[i:i + MM_BATCH_CHUNK_SIZE]
+              for i in range(0, len(persons), MM_BATCH_CHUNK_SIZE)]
+
+    file_count = 0
+    skill_count = 0
+    # 呼叫端可能是 Tk 程式的背景執行緒，以 spawn 啟動子行程，
+    # 不以 fork 複製 Tk 狀態、其他執行緒持有的鎖與已開啟的 SQLite 連線
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_mm_export_worker, initargs=(db_path,))
+    try:
+        futures = [executor.submit(export_mm_chunk, directory, chunk) for chunk in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            files, skills = future.result()
+            file_count += files
+            skill_count += skills
+            if progress:
+                progress(f"匯出中: {file_count}/{len(persons)} 個檔案")
+    finally:
+        # 取消或失敗時不再開始剩下的工作
+        executor.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"[匯出] FreeMind {file_count} 個檔案, {skill_count} 筆技能資料 | "
+          f"總計 {elapsed:.3f}s, {file_count / elapsed if elapsed else 0:.0f} 檔/秒")
+    return file_count, skill_count, elapsed
+
+#===========================================
+#  Synthetic data
+#===========================================
+# 產生測試資料時，最後一個年份期間 (period_key)
+GENERATE_LAST_PERIOD = 20252
+
+# 產生技能經驗文字用的詞彙
+GENERATE_PROJECTS = ["訂單系統", "報表平台", "行動應用", "資料倉儲", "內部工具", "客服系統", "支付閘道", "監控平台"]
+GENERATE_ACTIONS = ["開發", "維護", "重構", "效能調校", "導入", "測試", "設計架構", "移轉"]
+
+def load_skill_catalog(file_path=DEFAULT_CATALOG_PATH):
+    """讀取技能類型定義 {分類: [技能名稱, ...]}"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def generate_periods(count, last_period=GENERATE_LAST_PERIOD):
+    """回傳以 last_period 結尾、連續 count 個半年期間 [(year_period, period_key), ...]，由舊到新"""
+    year, half = divmod(last_period, 10)
+    periods = []
+    for _ in range(count):
+        periods.append((f"{year}H{half}", year * 10 + half))
+        year, half = (year, 1) if half == 2 else (year - 1, 2)
+    return periods[::-1]
+
+def generate_catalog(catalog, categories=None, skills=None):
+    """依技能類型定義組出 categories 個分類、每類 skills 個技能的目錄
+
+    不足的分類與技能以「分類N」、「技能名稱-N」補足；None 表示沿用定義的數量
+    """
+    names = list(catalog)
+    categories = len(names) if categories is None else categories
+    result = {}
+    for index in range(categories):
+        category = names[index] if index < len(names) else f"分類{index + 1}"
+        skill_names = list(catalog.get(category, []))
+        count = len(skill_names) if skills is None else skills
+        if not skill_names:
+            skill_names = [f"{category}技能"]
+        result[category] = [skill_names[i] if i < len(skill_names)
+                            else f"{skill_names[i % len(skill_names)]}-{i // len(skill_names) + 1}"
+                            for i in range(count)]
+    return result
+
+def generate_database(conn, persons=500, catalog=None, categories=None, skills=None, periods=10,
+                      coverage=0.5, experience_ratio=0.5, seed=0, batch_size=IMPORT_BATCH_SIZE):
+    """在空的資料庫中產生測試資料，回傳 (人員數, 技能資料筆數)
+
+    每位人員以 coverage 的機率擁有目錄中的各項技能，擁有的技能從某一期開始每期都有資料，
+    等級隨時間遞增；experience_ratio 為有經驗文字的比例。相同 seed 產生相同的資料
+    """
+    start_time = time.perf_counter()
+    if conn.execute("SELECT 1 FROM persons LIMIT 1").fetchone():
+        raise ValueError("資料庫已有資料，請指定新的資料庫檔案")
+    catalog = generate_catalog(catalog if catalog is not None else load_skill_catalog(),
+                               categories, skills)
+    period_list = generate_periods(periods)
+    rnd = random.Random(seed)
+    cursor = conn.cursor()
+    batch = []
+    skill_count = 0
+
+    def flush():
+        nonlocal skill_count
+        cursor.executemany("""
+            INSERT INTO skills (person_id, skill_category, skill_name, year_period, period_key, skill_level, experience)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, batch)
+        skill_count += len(batch)
+        batch.clear()
+
+    with transaction(conn):
+        for index in range(persons):
+            cursor.execute("INSERT INTO persons (name) VALUES (?)", (f"人員{index + 1:05d}",))
+            person_id = cursor.lastrowid
+            for category, skill_names in catalog.items():
+                for skill_name in skill_names:
+                    if rnd.random() >= coverage:
+                        continue
+                    level = rnd.randint(0, 3)
+                    for year_period, period_key in period_list[rnd.randrange(len(period_list)):]:
+                        experience = ""
+                        if rnd.random() < experience_ratio:
+                            experience = (f"{rnd.choice(GENERATE_ACTIONS)}{rnd.choice(GENERATE_PROJECTS)}，"
+                                          f"使用 {skill_name} ({category})")
+                        batch.append((person_id, category, skill_name, year_period, period_key,
+                                      level, experience))
+                        level = min(5, level + (rnd.random() < 0.3))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+    print(f"[產生] {persons} 位人員, {skill_count} 筆技能資料 | "
+          f"總計 {time.perf_counter() - start_time:.3f}s")
+    return persons, skill_count
+
+#===========================================
+#  Repositories
+#===========================================
+class SQLiteRepository:
+    """資料庫存取的共用基底，擁有連線與一個重複使用的 cursor
+
+    子類別的 SQL 都定義為固定字串，同一連線上重複執行時會命中
+    sqlite3 的 statement cache，不需每次重新編譯；查詢方法一律回傳
+    fetchone / fetchall 的結果，共用的 cursor 不會被外部持有
+    """
+
+    # open() 開啟的連線是否強制外鍵
+    FOREIGN_KEYS = True
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor()
+
+    @classmethod
+    def open(cls, db_path=DEFAULT_DB_PATH, profile=None, cached_statements=STATEMENT_CACHE_SIZE):
+        """開啟資料庫並建立 repository，schema 不存在時建立"""
+        repo = cls(connect_database(db_path, profile, cached_statements, cls.FOREIGN_KEYS))
+        repo.create_schema()
+        return repo
+
+    def create_schema(self):
+        """建立 repository 需要的資料表，由子類別覆寫"""
+
+    def execute(self, sql, params=()):
+        return self.run(sql, lambda: self.cursor.execute(sql, params))
+
+    def executemany(self, sql, rows):
+        return self.run(sql, lambda: self.cursor.executemany(sql, rows))
+
+    def fetchone(self, sql, params=()):
+        return self.run(sql, lambda: self.cursor.execute(sql, params).fetchone())
+
+    def fetchall(self, sql, params=()):
+        return self.run(sql, lambda: self.cursor.execute(sql, params).fetchall())
+
+    def run(self, sql, statement):
+        """執行 statement()，經 observe_query 記錄執行時間"""
+        return observe_query(sql, statement)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        """關閉連線，重複呼叫時不做任何事"""
+        if self.cursor is None:
+            return
+        self.cursor.close()
+        self.conn.close()
+        self.cursor = None
+
+
+class SkillRepository(SQLiteRepository):
+    """skill_tree11 使用的 skills.db：skills 每列為 (人員, 分類, 技能, 年份期間)"""
+
+    TREE_ROWS_SQL = """
+        SELECT persons.id, persons.name, skills.id, skill_category, skill_name,
+               year_period, period_key, skill_level, experience
+        FROM persons
+        LEFT JOIN skills ON skills.person_id = persons.id
+        ORDER BY persons.id, skill_category, skill_name, period_key, year_period
+    """
+    PERSON_NODES_SQL = """
+        SELECT id, name, EXISTS (SELECT 1 FROM skills WHERE skills.person_id = persons.id)
+        FROM persons
+        ORDER BY id
+    """
+    PERSON_CATEGORIES_SQL = """
+        SELECT DISTINCT skill_category
+        FROM skills
+        WHERE person_id = ?
+        ORDER BY skill_category
+    """
+    CATEGORY_SKILLS_SQL = """
+        SELECT DISTINCT skill_name
+        FROM skills
+        WHERE person_id = ? AND skill_category = ?
+        ORDER BY skill_name
+    """
+    SKILL_YEARS_SQL = """
+        SELECT id, year_period, period_key, skill_level, experience
+        FROM skills
+        WHERE person_id = ? AND skill_category = ? AND skill_name = ?
+        ORDER BY period_key, year_period
+    """
+    PERSONS_ROWS_SQL = """
+        SELECT persons.name, skills.id, skill_category, skill_name,
+               year_period, period_key, skill_level, experience
+        FROM persons
+        JOIN skills ON skills.person_id = persons.id
+        WHERE persons.id IN ({ids})
+        ORDER BY persons.id, skill_category, skill_name, period_key, year_period
+    """
+    ADD_PERSON_SQL = "INSERT INTO persons (name) VALUES (?)"
+    ADD_SKILL_SQL = """
+        INSERT INTO skills (person_id, skill_category, skill_name, year_period, period_key, skill_level, experience)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+    GET_SKILL_SQL = "SELECT skill_level, experience FROM skills WHERE id = ?"
+    SKILL_EXISTS_SQL = """
+        SELECT 1 FROM skills
+        WHERE person_id = ? AND skill_category = ? AND skill_name = ? AND year_period = ?
+    """
+    UPDATE_SKILL_SQL = "UPDATE skills SET skill_level = ?, experience = ? WHERE id = ?"
+    CLEAR_EXPERIENCE_SQL = "UPDATE skills SET experience = '' WHERE id = ?"
+    # skills.person_id 為 ON DELETE CASCADE，刪除人員時 SQLite 會一併刪除其技能
+    DELETE_PERSON_SQL = "DELETE FROM persons WHERE id = ?"
+    DELETE_CATEGORY_SQL = "DELETE FROM skills WHERE person_id = ? AND skill_category = ?"
+    DELETE_SKILL_SQL = """
+        DELETE FROM skills WHERE person_id = ? AND skill_category = ? AND skill_name = ?
+    """
+    DELETE_SKILL_ROW_SQL = "DELETE FROM skills WHERE id = ?"
+    # 多選操作：skill_selection 每列為一個選取條件，NULL 欄位表示不限，
+    # 展開後的 skills.id 放在 selected_skills
+    SELECTION_TABLES_SQL = (
+        """CREATE TEMP TABLE IF NOT EXISTS skill_selection (
+            person_id INTEGER, skill_category TEXT, skill_name TEXT, row_id INTEGER
+        )""",
+        "CREATE TEMP TABLE IF NOT EXISTS selected_skills (id INTEGER PRIMARY KEY)",
+    )
+    INSERT_SELECTION_SQL = """
+        INSERT INTO skill_selection (person_id, skill_category, skill_name, row_id) VALUES (?, ?, ?, ?)
+    """
+    EXPAND_SELECTION_SQL = """
+        INSERT OR IGNORE INTO selected_skills (id)
+        SELECT s.id FROM skill_selection sel
+        JOIN skills s ON s.person_id = sel.person_id
+        WHERE (sel.skill_category IS NULL OR s.skill_category = sel.skill_category)
+          AND (sel.skill_name IS NULL OR s.skill_name = sel.skill_name)
+          AND (sel.row_id IS NULL OR s.id = sel.row_id)
+    """
+    SELECTED_SKILL_IDS_SQL = "SELECT id FROM selected_skills"
+    SELECTED_PERSON_IDS_SQL = """
+        SELECT person_id FROM skill_selection
+        WHERE skill_category IS NULL AND skill_name IS NULL AND row_id IS NULL
+    """
+
+    def create_schema(self):
+        create_schema(self.conn)
+
+    # ---- 人員與技能 ----
+    def add_person(self, name):
+        """新增人員並回傳 id，姓名重複時引發 sqlite3.IntegrityError；由呼叫端 commit"""
+        return self.execute(self.ADD_PERSON_SQL, (name,)).lastrowid
+
+    def add_skill(self, person_id, category, skill_name, year_period, skill_level, experience=""):
+        """新增一筆技能資料並回傳 skills.id
+
+        同一人員、技能與年份已存在時引發 sqlite3.IntegrityError；由呼叫端 commit
+        """
+        return self.execute(self.ADD_SKILL_SQL, (
+            person_id, category, skill_name, year_period, period_sort_key(year_period),
+            skill_level, experience)).lastrowid
+
+    def get_skill(self, row_id):
+        """回傳 (等級, 經驗)，不存在時為 None"""
+        return self.fetchone(self.GET_SKILL_SQL, (row_id,))
+
+    def skill_exists(self, person_id, category, skill_name, year_period):
+        return self.fetchone(self.SKILL_EXISTS_SQL,
+                             (person_id, category, skill_name, year_period)) is not None
+
+    def update_skill(self, row_id, skill_level, experience):
+        self.execute(self.UPDATE_SKILL_SQL, (skill_level, experience, row_id))
+
+    def clear_experience(self, row_id):
+        self.execute(self.CLEAR_EXPERIENCE_SQL, (row_id,))
+
+    def delete_person(self, person_id):
+        self.delete_persons([person_id])
+
+    def delete_persons(self, person_ids):
+        """批次刪除人員及其所有技能資料"""
+        self.executemany(self.DELETE_PERSON_SQL, ((person_id,) for person_id in person_ids))
+
+    def delete_category(self, person_id, category):
+        self.execute(self.DELETE_CATEGORY_SQL, (person_id, category))
+
+    def delete_skill(self, person_id, category, skill_name):
+        self.execute(self.DELETE_SKILL_SQL, (person_id, category, skill_name))
+
+    def delete_skill_row(self, row_id):
+        self.delete_skill_rows([row_id])
+
+    def delete_skill_rows(self, row_ids):
+        """批次刪除多筆 skills.id"""
+        self.executemany(self.DELETE_SKILL_ROW_SQL, ((row_id,) for row_id in row_ids))
+
+    # ---- 多選操作 ----
+    def select_skills(self, selectors):
+        """將多選的節點展開為 skills.id 存入暫存表 selected_skills，回傳筆數
+
+        selectors 為 [(人員 id, 分類, 技能, skills.id), ...]，None 表示不限；
+        只有人員 id 的條件代表整位人員，之後的 delete_selected_persons 會刪除這些人員
+        """
+        for sql in self.SELECTION_TABLES_SQL:
+            self.execute(sql)
+        self.clear_selection()
+        self.executemany(self.INSERT_SELECTION_SQL, selectors)
+        self.execute(self.EXPAND_SELECTION_SQL)
+        return self.fetchone("SELECT COUNT(*) FROM selected_skills")[0]
+
+    def delete_selected_skills(self):
+        self.execute(f"DELETE FROM skills WHERE id IN ({self.SELECTED_SKILL_IDS_SQL})")
+
+    def delete_selected_persons(self):
+        self.execute(f"DELETE FROM persons WHERE id IN ({self.SELECTED_PERSON_IDS_SQL})")
+
+    def update_selected_level(self, skill_level):
+        self.execute(f"UPDATE skills SET skill_level = ? WHERE id IN ({self.SELECTED_SKILL_IDS_SQL})",
+                     (skill_level,))
+
+    def clear_selection(self):
+        self.execute("DELETE FROM skill_selection")
+        self.execute("DELETE FROM selected_skills")
+
+    # ---- 樹狀圖載入 ----
+    def tree_rows(self):
+        """所有人員與技能，依人員、分類、技能、年份排序；沒有技能的人員只有一列 NULL"""
+        return self.fetchall(self.TREE_ROWS_SQL)
+
+    def person_nodes(self):
+        """[(人員 id, 姓名, 是否有技能), ...]"""
+        return self.fetchall(self.PERSON_NODES_SQL)
+
+    def person_categories(self, person_id):
+        return [row[0] for row in self.fetchall(self.PERSON_CATEGORIES_SQL, (person_id,))]
+
+    def category_skills(self, person_id, category):
+        return [row[0] for row in self.fetchall(self.CATEGORY_SKILLS_SQL, (person_id, category))]
+
+    def skill_years(self, person_id, category, skill_name):
+        """[(skills.id, 年份, period_key, 等級, 經驗), ...]，依年份排序"""
+        return self.fetchall(self.SKILL_YEARS_SQL, (person_id, category, skill_name))
+
+    def persons_rows(self, person_ids):
+        """以 id IN (...) 分批查出多位人員的技能資料，依人員 id 排序
+
+        只有 SELECT，不會開啟交易或持有資料庫的鎖，也不影響 EditJournal 尚未提交的編輯
+        回傳 [(姓名, skills.id, 分類, 技能, 年份, period_key, 等級, 經驗), ...]
+        """
+        # 各批的人員 id 遞增，依序串接即為整體的排序
+        person_ids = sorted(set(person_ids))
+        rows = []
+        for start in range(0, len(person_ids), PERSON_ID_CHUNK_SIZE):
+            chunk = person_ids[start:start + PERSON_ID_CHUNK_SIZE]
+            sql = self.PERSONS_ROWS_SQL.format(ids=', '.join('?' * len(chunk)))
+            rows += self.fetchall(sql, chunk)
+        return rows
+
+    # ---- 查詢 ----
+    def search(self, limit=None, offset=0, **criteria):
+        return search_skills(self.conn, limit, offset, **criteria)
+
+    def count(self, **criteria):
+        return count_skills(self.conn, **criteria)
+
+    def aggregate(self, group_by, **criteria):
+        return aggregate_skills(self.conn, group_by, **criteria)
+
+    def search_experience(self, text, limit=FTS_RESULT_LIMIT):
+        return search_experience(self.conn, text, limit)
+
+
+class EditJournal:
+    """skill_tree11 編輯操作的復原/重做記錄，並將多次編輯合併為一次 commit
+
+    每個使用者操作記為一筆 (標籤, [(資料表, 修改前的列, 修改後的列), ...])，
+    新增時修改前為 None、刪除時修改後為 None；復原時依相反順序套用反向的修改。
+    編輯不會立即 commit，而是累積在同一個交易中，由 flush() 一次提交
+    """
+
+    COLUMNS = {
+        'persons': ('id', 'name'),
+        'skills': ('id', 'person_id', 'skill_category', 'skill_name', 'year_period', 'period_key',
+                   'skill_level', 'experience'),
+    }
+
+    def __init__(self, repo, limit=JOURNAL_UNDO_LIMIT, log=print):
+        self.repo = repo
+        self.limit = limit
+        # 輸出 [儲存] 訊息的函式，skill_tree11 只在啟用效能記錄時輸出
+        self.log = log
+        self.undo_stack = []
+        self.redo_stack = []
+        # 目前正在記錄的操作的修改清單
+        self.current = None
+        # 上次 flush 之後的操作數
+        self.pending = 0
+
+    @contextlib.contextmanager
+    def savepoint(self):
+        """區塊內的修改失敗時只回滾這一段，不影響尚未提交的其他編輯"""
+        if not self.repo.conn.in_transaction:
+            self.repo.execute("BEGIN")
+        self.repo.execute("SAVEPOINT edit_journal")
+        try:
+            yield
+        except BaseException:
+            self.repo.execute("ROLLBACK TO edit_journal")
+            self.repo.execute("RELEASE edit_journal")
+            raise
+        self.repo.execute("RELEASE edit_journal")
+
+    @contextlib.contextmanager
+    def record(self, label):
+        """區塊內透過 journal 的修改記為一筆可復原的操作，巢狀呼叫時併入外層"""
+        if self.current is not None:
+            yield
+            return
+        self.current = changes = []
+        try:
+            with self.savepoint():
+                yield
+        finally:
+            self.current = None
+        if changes:
+            self.undo_stack.append((label, changes))
+            del self.undo_stack[:-self.limit]
+            self.redo_stack.clear()
+            self.pending += 1
+
+    def rows(self, table, where, params=()):
+        """{id: 完整資料列} 供記錄修改前後的內容"""
+        columns = ', '.join(self.COLUMNS[table])
+        return {row[0]: row for row in self.repo.fetchall(
+            f"SELECT {columns} FROM {table} WHERE {where}", params)}
+
+    def changed(self, table, before, new_ids=()):
+        """比對 before ({id: 修改前的列}) 與目前的內容，記錄到目前的操作"""
+        ids = list(before) + list(new_ids)
+        after = {}
+        for start in range(0, len(ids), JOURNAL_ID_CHUNK_SIZE):
+            chunk = ids[start:start + JOURNAL_ID_CHUNK_SIZE]
+            after.update(self.rows(table, f"id IN ({', '.join('?' * len(chunk))})", chunk))
+        for row_id in ids:
+            if before.get(row_id) != after.get(row_id):
+                self.current.append((table, before.get(row_id), after.get(row_id)))
+
+    def apply(self, table, before, after):
+        """將資料列從 before 改為 after"""
+        columns = self.COLUMNS[table]
+        if after is None:
+            self.repo.execute(f"DELETE FROM {table} WHERE id = ?", (before[0],))
+        elif before is None:
+            self.repo.execute(f"INSERT INTO {table} ({', '.join(columns)}) "
+                              f"VALUES ({', '.join('?' * len(columns))})", after)
+        else:
+            self.repo.execute(f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns[1:])} "
+                              f"WHERE id = ?", after[1:] + after[:1])
+
+    def replay(self, source, target, inverse):
+        """從 source 取出最後一筆操作套用後移到 target，回傳 (標籤, 套用的修改)"""
+        if not source:
+            return None
+        label, changes = source[-1]
+        applied = ([(table, after, before) for table, before, after in reversed(changes)]
+                   if inverse else changes)
+        with self.savepoint():
+            for change in applied:
+                self.apply(*change)
+        target.append(source.pop())
+        self.pending += 1
+        return label, applied
+
+    def undo(self):
+        """復原最後一個操作，沒有可復原的操作時回傳 None"""
+        return self.replay(self.undo_stack, self.redo_stack, inverse=True)
+
+    def redo(self):
+        """重做最後一個復原的操作，沒有時回傳 None"""
+        return self.replay(self.redo_stack, self.undo_stack, inverse=False)
+
+    def flush(self):
+        """提交累積的編輯，回傳合併的操作數"""
+        pending, self.pending = self.pending, 0
+        if self.repo.conn.in_transaction:
+            self.repo.commit()
+        if pending:
+            self.log(f"[儲存] {pending} 個操作合併為一次 commit")
+        return pending
+
+    def clear(self):
+        """清除復原/重做記錄，資料被其他連線大量修改 (例如匯入) 後使用"""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    # ---- 可復原的編輯 ----
+    def add_person(self, name):
+        with self.record(f"新增人員 {name}"):
+            person_id = self.repo.add_person(name)
+            self.changed('persons', {}, [person_id])
+        return person_id
+
+    def add_skill(self, person_id, category, skill_name, year_period, skill_level, experience=""):
+        with self.record(f"新增技能 {skill_name} {year_period}"):
+            row_id = self.repo.add_skill(person_id, category, skill_name, year_period,
+                                         skill_level, experience)
+            self.changed('skills', {}, [row_id])
+        return row_id
+
+    def update_skill(self, row_id, skill_level, experience):
+        with self.record("更新技能"):
+            before = self.rows('skills', "id = ?", (row_id,))
+            self.repo.update_skill(row_id, skill_level, experience)
+            self.changed('skills', before)
+
+    def clear_experience(self, row_id):
+        with self.record("刪除技能經驗"):
+            before = self.rows('skills', "id = ?", (row_id,))
+            self.repo.clear_experience(row_id)
+            self.changed('skills', before)
+
+    def delete_person(self, person_id):
+        with self.record("刪除人員"):
+            skills = self.rows('skills', "person_id = ?", (person_id,))
+            persons = self.rows('persons', "id = ?", (person_id,))
+            self.repo.delete_person(person_id)
+            # 技能先於人員刪除，復原時人員會先於技能重新建立
+            self.changed('skills', skills)
+            self.changed('persons', persons)
+
+    def delete_category(self, person_id, category):
+        with self.record(f"刪除分類 {category}"):
+            before = self.rows('skills', "person_id = ? AND skill_category = ?", (person_id, category))
+            self.repo.delete_category(person_id, category)
+            self.changed('skills', before)
+
+    def delete_skill(self, person_id, category, skill_name):
+        with self.record(f"刪除技能 {skill_name}"):
+            before = self.rows('skills', "person_id = ? AND skill_category = ? AND skill_name = ?",
+                               (person_id, category, skill_name))
+            self.repo.delete_skill(person_id, category, skill_name)
+            self.changed('skills', before)
+
+    def delete_skill_row(self, row_id):
+        with self.record("刪除技能年份"):
+            before = self.rows('skills', "id = ?", (row_id,))
+            self.repo.delete_skill_row(row_id)
+            self.changed('skills', before)
+
+    def delete_selection(self, selectors, experience_row_ids=()):
+        """以單一交易刪除多選的人員、分類、技能與年份，並清除 experience_row_ids 的經驗
+
+        selectors 的格式見 SkillRepository.select_skills；回傳刪除的技能資料筆數
+        """
+        with self.record(f"刪除 {len(selectors) + len(experience_row_ids)} 個項目"):
+            self.repo.select_skills(selectors)
+            skills = self.rows('skills', f"id IN ({self.repo.SELECTED_SKILL_IDS_SQL})")
+            persons = self.rows('persons', f"id IN ({self.repo.SELECTED_PERSON_IDS_SQL})")
+            experiences = {}
+            for row_id in experience_row_ids:
+                if row_id not in skills:
+                    experiences.update(self.rows('skills', "id = ?", (row_id,)))
+            self.repo.delete_selected_skills()
+            self.repo.delete_selected_persons()
+            self.repo.executemany(self.repo.CLEAR_EXPERIENCE_SQL, ((row_id,) for row_id in experiences))
+            self.repo.clear_selection()
+            self.changed('skills', experiences)
+            self.changed('skills', skills)
+            self.changed('persons', persons)
+        return len(skills)
+
+    def set_selection_level(self, selectors, skill_level):
+        """以單一 UPDATE 將多選範圍內所有技能資料的等級設為 skill_level，回傳更新的 skills.id"""
+        with self.record(f"設定等級 {skill_level}"):
+            self.repo.select_skills(selectors)
+            before = self.rows('skills', f"id IN ({self.repo.SELECTED_SKILL_IDS_SQL})")
+            self.repo.update_selected_level(skill_level)
+            self.repo.clear_selection()
+            self.changed('skills', before)
+        return list(before)
+
+
+class SkillHistoryRepository(SQLiteRepository):
+    """v2_skill_tree_2 使用的 schema：skills 每列為 (人員, 分類, 技能)，
+    各年度的等級與核准者另存於 skill_history
+    """
+
+    # 外鍵沒有 ON DELETE 動作，強制外鍵時 INSERT OR REPLACE 已有歷史記錄的技能會失敗
+    FOREIGN_KEYS = False
+
+    SKILL_TREE_SQL = """
+        SELECT p.name, s.id, s.category, s.name, s.experience, h.year, h.level, h.approve
+        FROM persons p
+        LEFT JOIN skills s ON s.person_id = p.id
+        LEFT JOIN skill_history h ON h.skill_id = s.id
+        ORDER BY p.id, s.category, s.name, h.year
+    """
+    PERSON_NAMES_SQL = "SELECT name FROM persons"
+    PERSON_ID_SQL = "SELECT id FROM persons WHERE name = ?"
+    ADD_PERSON_SQL = "INSERT INTO persons (name) VALUES (?)"
+    ENSURE_PERSON_SQL = "INSERT OR IGNORE INTO persons (name) VALUES (?)"
+    SKILL_ID_SQL = """
+        SELECT s.id
+        FROM skills s
+        JOIN persons p ON s.person_id = p.id
+        WHERE p.name = ? AND s.category = ? AND s.name = ?
+    """
+    ADD_SKILL_SQL = "INSERT INTO skills (person_id, category, name, experience) VALUES (?, ?, ?, ?)"
+    REPLACE_SKILL_SQL = """
+        INSERT OR REPLACE INTO skills (person_id, category, name, experience) VALUES (?, ?, ?, ?)
+    """
+    UPDATE_EXPERIENCE_SQL = """
+        UPDATE skills
+        SET experience = ?
+        WHERE id IN (
+            SELECT s.id
+            FROM skills s
+            JOIN persons p ON s.person_id = p.id
+            WHERE p.name = ? AND s.category = ? AND s.name = ?
+        )
+    """
+    HISTORY_EXISTS_SQL = "SELECT id FROM skill_history WHERE skill_id = ? AND year = ?"
+    ADD_HISTORY_SQL = "INSERT INTO skill_history (skill_id, year, level, approve) VALUES (?, ?, ?, ?)"
+    REPLACE_HISTORY_SQL = """
+        INSERT OR REPLACE INTO skill_history (skill_id, year, level, approve) VALUES (?, ?, ?, ?)
+    """
+    UPDATE_HISTORY_SQL = "UPDATE skill_history SET level = ?, approve = ? WHERE skill_id = ? AND year = ?"
+    DELETE_HISTORY_SQL = "DELETE FROM skill_history WHERE skill_id = ?"
+    CSV_ROWS_SQL = """
+        SELECT p.name, s.category, s.name, s.experience,
+               h.year, h.level, h.approve
+        FROM persons p
+        JOIN skills s ON p.id = s.person_id
+        LEFT JOIN skill_history h ON s.id = h.skill_id
+        ORDER BY p.name, s.category, s.name, h.year
+    """
+
+    def create_schema(self):
+        """persons 表不存在時建立三個資料表，回傳是否有建立"""
+        if self.fetchone("SELECT name FROM sqlite_master WHERE type='table' AND name='persons'"):
+            return False
+
+        self.execute("""
+            CREATE TABLE persons (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE
+            )
+        """)
+        self.execute("""
+            CREATE TABLE skills (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                person_id INTEGER,
+                category TEXT,
+                name TEXT,
+                experience TEXT,
+                FOREIGN KEY (person_id) REFERENCES persons(id),
+                UNIQUE(person_id, category, name)
+            )
+        """)
+        self.execute("""
+            CREATE TABLE skill_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                skill_id INTEGER,
+                year TEXT,
+                level INTEGER,
+                approve TEXT,
+                FOREIGN KEY (skill_id) REFERENCES skills(id),
+                UNIQUE(skill_id, year)
+            )
+        """)
+        self.commit()
+        return True
+
+    def skill_tree(self):
+        """一次查出所有人員、技能與歷史記錄，取代逐人逐技能的查詢
+
+        回傳 [(姓名, skills.id, 分類, 技能, 經驗, 年度, 等級, 核准者), ...]，
+        沒有技能或歷史記錄的欄位為 NULL
+        """
+        return self.fetchall(self.SKILL_TREE_SQL)
+
+    def person_names(self):
+        return [row[0] for row in self.fetchall(self.PERSON_NAMES_SQL)]
+
+    def person_id(self, name):
+        row = self.fetchone(self.PERSON_ID_SQL, (name,))
+        return row[0] if row else None
+
+    def add_person(self, name):
+        return self.execute(self.ADD_PERSON_SQL, (name,)).lastrowid
+
+    def ensure_person(self, name):
+        """取得人員 id，不存在時新增"""
+        self.execute(self.ENSURE_PERSON_SQL, (name,))
+        return self.person_id(name)
+
+    def skill_id(self, person_name, category, skill_name):
+        row = self.fetchone(self.SKILL_ID_SQL, (person_name, category, skill_name))
+        return row[0] if row else None
+
+    def add_skill(self, person_id, category, skill_name, experience):
+        return self.execute(self.ADD_SKILL_SQL, (person_id, category, skill_name, experience)).lastrowid
+
+    def replace_skill(self, person_id, category, skill_name, experience):
+        """新增或取代技能 (INSERT OR REPLACE)，回傳新的 skills.id"""
+        return self.execute(self.REPLACE_SKILL_SQL,
+                            (person_id, category, skill_name, experience)).lastrowid
+
+    def update_experience(self, person_name, category, skill_name, experience):
+        self.execute(self.UPDATE_EXPERIENCE_SQL, (experience, person_name, category, skill_name))
+
+    def history_exists(self, skill_id, year):
+        return self.fetchone(self.HISTORY_EXISTS_SQL, (skill_id, year)) is not None
+
+    def add_history(self, skill_id, year, level, approve):
+        self.execute(self.ADD_HISTORY_SQL, (skill_id, year, level, approve))
+
+    def update_history(self, skill_id, year, level, approve):
+        self.execute(self.UPDATE_HISTORY_SQL, (level, approve, skill_id, year))
+
+    def replace_histories(self, skill_id, histories):
+        """以 [(年度, 等級, 核准者), ...] 取代技能的所有歷史記錄"""
+        self.execute(self.DELETE_HISTORY_SQL, (skill_id,))
+        self.executemany(self.ADD_HISTORY_SQL,
+                         ((skill_id, year, level, approve) for year, level, approve in histories))
+
+    def upsert_histories(self, rows):
+        """批次新增或取代 [(skills.id, 年度, 等級, 核准者), ...]"""
+        self.executemany(self.REPLACE_HISTORY_SQL, rows)
+
+    def csv_rows(self):
+        return self.fetchall(self.CSV_ROWS_SQL)
+
+
+class SkillTypeCatalog(SQLiteRepository):
+    """技能類型目錄：skill_type.json 的內容匯入 skill_types 表，查詢時使用記憶體中的索引
+
+    以檔案的修改時間與大小判斷是否需要重新讀取，內容的 SHA-256 與上次匯入相同時不重新匯入；
+    兩種 schema 的資料庫都可使用，資料表不存在時自動建立
+    """
+
+    CREATE_TABLES_SQL = (
+        # position 為在檔案中的順序；沒有技能的分類以 skill_name 為 NULL 的一列保留
+        """CREATE TABLE IF NOT EXISTS skill_types (
+            position INTEGER PRIMARY KEY,
+            category TEXT NOT NULL,
+            skill_name TEXT
+        )""",
+        # 上次匯入的檔案 (只有一列)
+        """CREATE TABLE IF NOT EXISTS skill_type_source (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            path TEXT,
+            mtime_ns INTEGER,
+            size INTEGER,
+            sha256 TEXT
+        )""",
+    )
+    SOURCE_SQL = "SELECT path, mtime_ns, size, sha256 FROM skill_type_source WHERE id = 1"
+    SAVE_SOURCE_SQL = """
+        INSERT OR REPLACE INTO skill_type_source (id, path, mtime_ns, size, sha256) VALUES (1, ?, ?, ?, ?)
+    """
+    TYPES_SQL = "SELECT category, skill_name FROM skill_types ORDER BY position"
+    INSERT_TYPE_SQL = "INSERT INTO skill_types (position, category, skill_name) VALUES (?, ?, ?)"
+
+    def __init__(self, conn, file_path=DEFAULT_CATALOG_PATH):
+        super().__init__(conn)
+        self.file_path = os.path.abspath(file_path)
+        # 分類 -> [技能名稱, ...]，依檔案中的順序
+        self.types = {}
+        # 上次檢查時檔案的 (路徑, 修改時間, 大小)
+        self.stamp = None
+
+    def create_schema(self):
+        for sql in self.CREATE_TABLES_SQL:
+            self.execute(sql)
+        self.commit()
+
+    def file_stamp(self):
+        """(路徑, 修改時間, 大小)，檔案不存在時為 None"""
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return self.file_path, stat.st_mtime_ns, stat.st_size
+
+    def changed(self):
+        """檔案在上次 sync 之後是否有變更 (只檢查 stat，不讀取內容)"""
+        return self.file_stamp() != self.stamp
+
+    def load(self):
+        """建立資料表、與檔案同步並回傳目錄 {分類: [技能名稱, ...]}"""
+        self.create_schema()
+        self.sync()
+        return self.types
+
+    def sync(self):
+        """檔案有變更時重新匯入並更新記憶體索引，回傳目錄內容是否改變
+
+        檔案不存在時沿用資料庫中上次匯入的目錄；格式錯誤時引發 ValueError，
+        在檔案再次變更前不會重新讀取
+        """
+        self.stamp = stamp = self.file_stamp()
+        source = self.fetchone(self.SOURCE_SQL)
+        imported = False
+        if stamp is not None and (source is None or tuple(source[:3]) != stamp):
+            with open(self.file_path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if source is None or source[0] != stamp[0] or source[3] != digest:
+                self.import_types(json.loads(data.decode('utf-8')))
+                imported = True
+            self.execute(self.SAVE_SOURCE_SQL, stamp + (digest,))
+            self.commit()
+
+        if not imported and self.types:
+            return False
+        types = {}
+        for category, skill_name in self.fetchall(self.TYPES_SQL):
+            skills = types.setdefault(category, [])
+            if skill_name is not None:
+                skills.append(skill_name)
+        changed = types != self.types
+        self.types = types
+        if imported:
+            print(f"[技能類型] 匯入 {len(types)} 個分類, "
+                  f"{sum(len(skills) for skills in types.values())} 個技能")
+        return changed
+
+    def import_types(self, types):
+        """以 types ({分類: [技能名稱, ...]}) 取代 skill_types 的內容，由呼叫端 commit"""
+        if not isinstance(types, dict) or not all(isinstance(skills, list) for skills in types.values()):
+            raise ValueError(f"{self.file_path} 的格式必須是 {{分類: [技能名稱, ...]}}")
+        rows = []
+        for category, skills in types.items():
+            for skill_name in skills or [None]:
+                rows.append((len(rows), category, skill_name))
+        self.execute("DELETE FROM skill_types")
+        self.executemany(self.INSERT_TYPE_SQL, rows)
+
+    def skills(self, category):
+        """分類的技能名稱清單，未知的分類回傳空清單"""
+        return self.types.get(category, [])
+
+#===========================================
+#  Command line
+#===========================================
+def positive_int(text):
+    """argparse 的 type：大於 0 的整數"""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"必須是大於 0 的整數: {text}")
+    return value
+
+def add_filter_arguments(parser):
+    """search 與 stats 共用的查詢條件參數"""
+    parser.add_argument('--category', help="技能分類")
+    parser.add_argument('--skill', dest='skill_name', help="技能名稱")
+    parser.add_argument('--from', dest='period_from', help="起始年份期間，例: 2022H1")
+    parser.add_argument('--to', dest='period_to', help="結束年份期間，只填年份時包含整年")
+    parser.add_argument('--min-level', type=int, help="最低技能等級")
+    parser.add_argument('--max-level', type=int, help="最高技能等級")
+
+def filter_criteria(args):
+    return {
+        'category': args.category,
+        'skill_name': args.skill_name,
+        'period_from': args.period_from,
+        'period_to': args.period_to,
+        'min_level': args.min_level,
+        'max_level': args.max_level,
+    }
+
+def print_rows(rows, as_json=False):
+    """輸出查詢結果：預設每列以 tab 分隔，--json 時每列一個 JSON 陣列"""
+    for row in rows:
+        if as_json:
+            print(json.dumps(row, ensure_ascii=False))
+        else:
+            print("\t".join("" if value is None else str(value).replace("\n", " ") for value in row))
+
+def main(argv=None):
+    """命令列進入點，回傳 exit code"""
+    parser = argparse.ArgumentParser(description="技能資料庫命令列工具")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="資料庫檔案 (預設 skills.db)")
+    parser.add_argument('--db-profile', choices=sorted(CONNECTION_PROFILES), help="連線設定")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('import', help="從 JSON 檔匯入")
+    command.add_argument('file')
+
+    command = commands.add_parser('export', help="匯出為 JSON 檔")
+    command.add_argument('file')
+    command.add_argument('--compact', action='store_true', help="不縮排")
+
+    command = commands.add_parser('export-mm', help="匯出為 FreeMind (.mm) 檔")
+    command.add_argument('file', nargs='?', help="匯出所有人員 (或 --person 指定的人員) 到單一檔案")
+    command.add_argument('--person', help="只匯出此人員")
+    command.add_argument('--dir', help="每位人員各匯出一個檔案到此資料夾")
+    command.add_argument('--workers', type=int, help="--dir 使用的行程數 (預設為 CPU 數)")
+
+    command = commands.add_parser('search', help="查詢技能資料")
+    add_filter_arguments(command)
+    command.add_argument('--text', help="以全文索引搜尋技能經驗")
+    command.add_argument('--limit', type=int, help="最多輸出的筆數")
+    command.add_argument('--json', action='store_true', help="每列輸出一個 JSON 陣列")
+
+    command = commands.add_parser('generate', help="在新的資料庫中產生測試資料")
+    command.add_argument('--persons', type=int, default=500, help="人員數 (預設 500)")
+    command.add_argument('--categories', type=int, help="分類數 (預設為技能類型定義的分類數)")
+    command.add_argument('--skills', type=int, help="每個分類的技能數 (預設為定義的技能數)")
+    command.add_argument('--periods', type=int, default=10, help="半年期間數 (預設 10)")
+    command.add_argument('--coverage', type=float, default=0.5, help="每位人員擁有各技能的機率")
+    command.add_argument('--catalog', default='skill_type.json', help="技能類型定義檔")
+    command.add_argument('--seed', type=int, default=0, help="亂數種子")
+
+    command = commands.add_parser('cleanup', help="刪除人員已不存在 (或 --duplicates 重複) 的技能資料")
+    command.add_argument('--vacuum', action='store_true', help="清除後以 VACUUM 釋放檔案空間")
+    command.add_argument('--duplicates', action='store_true',
+                         help="另外刪除重複的 (人員, 分類, 技能, 年份)，每組只保留最後寫入的一筆")
+
+    command = commands.add_parser('benchmark-profiles', help="比較各連線設定的單筆編輯延遲 (使用暫存資料庫)")
+    command.add_argument('--edits', type=positive_int, default=200, help="每種設定的編輯次數 (預設 200)")
+    command.add_argument('--profile', action='append', choices=sorted(CONNECTION_PROFILES),
+                         help="只比較指定的設定，可重複指定")
+
+    command = commands.add_parser('stats', help="統計人數、平均與最高等級")
+    add_filter_arguments(command)
+    command.add_argument('--group-by', default='category,skill,period',
+                         help=f"分組欄位，以逗號分隔: {','.join(AGGREGATE_GROUPS)}")
+    command.add_argument('--json', action='store_true', help="每列輸出一個 JSON 陣列")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'export-mm' and args.dir:
+        # 子行程各自開啟唯讀連線，主行程不需要連線
+        export_mm_directory(args.db, args.dir, workers=args.workers)
+        return 0
+
+    if args.command == 'benchmark-profiles':
+        # 在暫存目錄建立測試資料庫，不開啟 --db 指定的資料庫
+        benchmark_connection_profiles(args.edits, args.profile)
+        return 0
+
+    conn = connect_database(args.db, args.db_profile)
+    try:
+        # 重複資料會讓 schema 升級停止，須在 create_schema 之前刪除
+        if args.command == 'cleanup' and args.duplicates:
+            delete_duplicate_skills(conn)
+        create_schema(conn)
+
+        if args.command == 'import':
+            import_json_file(conn, args.file)
+
+        elif args.command == 'export':
+            export_json_file(conn, args.file, compact=args.compact)
+
+        elif args.command == 'export-mm':
+            if not args.file:
+                parser.error("export-mm 需要指定檔案或 --dir")
+            person_id = None
+            if args.person:
+                row = conn.execute("SELECT id FROM persons WHERE name = ?", (args.person,)).fetchone()
+                if row is None:
+                    parser.error(f"找不到人員: {args.person}")
+                person_id = row[0]
+            export_mm_file(conn, args.file, person_id)
+
+        elif args.command == 'search':
+            if args.text:
+                rows = search_experience(conn, args.text, limit=args.limit or FTS_RESULT_LIMIT)
+            else:
+                rows = search_skills(conn, limit=args.limit, **filter_criteria(args))
+            print_rows(rows, args.json)
+
+        elif args.command == 'generate':
+            generate_database(conn, args.persons, load_skill_catalog(args.catalog),
+                              args.categories, args.skills, args.periods,
+                              coverage=args.coverage, seed=args.seed)
+
+        elif args.command == 'cleanup':
+            # --duplicates 已在升級 schema 前處理
+            delete_orphan_skills(conn, vacuum=args.vacuum)
+
+        elif args.command == 'stats':
+            group_by = [name.strip() for name in args.group_by.split(',') if name.strip()]
+            unknown = [name for name in group_by if name not in AGGREGATE_GROUPS]
+            if unknown:
+                parser.error(f"未知的分組欄位: {', '.join(unknown)}")
+            print_rows(aggregate_skills(conn, group_by, **filter_criteria(args)), args.json)
+
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,289 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import tkinter.scrolledtext as scrolledtext
-import json
+import atexit
+import bisect
+import contextlib
+import os
+import queue
 import sqlite3
+import sys
+import threading
+import time
+import traceback
 from datetime import datetime
-import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+from skill_db import (
+    AGGREGATE_GROUPS, FTS_MIN_TERM_LENGTH, FTS_RESULT_LIMIT, DuplicateSkillsError, EditJournal,
+    OperationCancelled, SkillRepository, SkillTypeCatalog, connect_database, export_json_file,
+    export_mm_directory, export_mm_file, import_json_file, period_range_bounds, period_sort_key,
+    set_query_observer,
+)
+
+# 延遲載入模式下，尚未展開節點的佔位子節點 ID 前綴
+PLACEHOLDER_PREFIX = "__placeholder__"
+
+# 全文搜尋輸入停止多久 (毫秒) 後才執行搜尋
+FTS_SEARCH_DELAY = 150
+
+# 查詢結果每頁顯示的筆數
+SEARCH_PAGE_SIZE = 100
+
+# 累積的編輯每隔多久 (毫秒) 自動 commit 一次
+JOURNAL_COMMIT_INTERVAL = 5000
+
+# 每隔多久 (毫秒) 檢查 skill_type.json 是否有變更
+CATALOG_POLL_INTERVAL = 2000
+
+# 樹狀節點資訊：kind 為 person / category / skill / year / level / exp，
+# row_id 為年份節點 (及其等級、經驗子節點) 對應的 skills.id
+NodeInfo = namedtuple('NodeInfo', ['kind', 'person_name', 'person_id', 'category',
+                                   'skill_name', 'year_period', 'row_id'])
+
+# 效能分析：SKILLS_PROFILE=1 (或 --profile) 輸出 [啟動]、[載入] 計時，記錄各階段時間、查詢時間與樹狀節點插入數，
+# SKILLS_PROFILE=cprofile (或 --profile=cprofile) 另外以 cProfile 分析，結束時輸出摘要
+PROFILE_ENV = 'SKILLS_PROFILE'
+PROFILE_OUTPUT = 'skill_tree11.prof'
+PROFILE_TOP_QUERIES = 10
+PROFILE_TOP_FUNCTIONS = 15
+
+class StartupProfiler:
+    """啟動與執行期間的效能記錄
+
+    停用時各方法皆不做任何事，不影響一般執行
+    """
+
+    def __init__(self, enabled=False, use_cprofile=False):
+        self.enabled = enabled
+        self.phases = []
+        # 正規化後的 SQL -> [次數, 總秒數, 最長秒數]；查詢可能來自背景執行緒
+        self.queries = {}
+        self.lock = threading.Lock()
+        # Treeview 名稱 -> 插入節點數
+        self.inserts = {}
+        self.profile = None
+        if not enabled:
+            return
+        if use_cprofile:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        set_query_observer(self.record_query)
+        atexit.register(self.report)
+
+    @classmethod
+    def from_environment(cls, argv):
+        """依環境變數 SKILLS_PROFILE 或 --profile[=cprofile] 參數建立"""
+        mode = os.environ.get(PROFILE_ENV, '')
+        for arg in argv:
+            if arg == '--profile':
+                mode = mode or '1'
+            elif arg.startswith('--profile='):
+                mode = arg.split('=', 1)[1]
+        mode = mode.lower()
+        return cls(enabled=mode not in ('', '0', 'off'), use_cprofile=mode == 'cprofile')
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """記錄 with 區塊的執行時間"""
+        if not self.enabled:
+            yield
+            return
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start_time)
+
+    def add_phase(self, name, seconds):
+        if self.enabled:
+            self.phases.append((name, seconds))
+
+    def log(self, message):
+        """啟用時立即輸出 [啟動]、[載入] 等計時訊息"""
+        if self.enabled:
+            print(message)
+
+    def record_query(self, sql, seconds):
+        key = ' '.join(sql.split())
+        with self.lock:
+            stats = self.queries.setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def watch_tree(self, name, tree):
+        """計算 tree.insert 的呼叫次數"""
+        if not self.enabled:
+            return
+        self.inserts.setdefault(name, 0)
+        insert = tree.insert
+
+        def counted_insert(*args, **kwargs):
+            self.inserts[name] += 1
+            return insert(*args, **kwargs)
+
+        tree.insert = counted_insert
+
+    def report(self):
+        """輸出摘要，程式結束時自動呼叫"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self.profile is not None:
+            self.profile.disable()
+        set_query_observer(None)
+        print("[效能] 階段時間:")
+        for name, seconds in self.phases:
+            print(f"[效能]   {name:<28} {seconds:8.3f}s")
+
+        with self.lock:
+            queries = sorted(self.queries.items(), key=lambda item: item[1][1], reverse=True)
+        print(f"[效能] 查詢: {sum(stats[0] for _, stats in queries)} 次, "
+              f"共 {sum(stats[1] for _, stats in queries):.3f}s "
+              f"(前 {PROFILE_TOP_QUERIES} 名, 依總時間排序):")
+        for sql, (count, total, longest) in queries[:PROFILE_TOP_QUERIES]:
+            print(f"[效能]   {total:8.3f}s {count:6d} 次 最長 {longest:.4f}s | {sql[:100]}")
+
+        for name, count in self.inserts.items():
+            print(f"[效能] {name} 插入節點: {count} 個")
+
+        if self.profile is not None:
+            import pstats
+            self.profile.dump_stats(PROFILE_OUTPUT)
+            print(f"[效能] cProfile 結果已存至 {PROFILE_OUTPUT}")
+            pstats.Stats(self.profile).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+
+class DatabaseWorker:
+    """資料庫背景執行緒
+
+    以自己的連線依序執行排入佇列的工作，結果放入結果佇列，
+    再由 Tk 主執行緒以 root.after 定期取出並呼叫對應的回呼函式
+    """
+
+    POLL_INTERVAL = 50  # 毫秒
+
+    def __init__(self, root, db_path, db_profile=None):
+        self.root = root
+        self.db_path = db_path
+        self.db_profile = db_profile
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.root.after(self.POLL_INTERVAL, self.poll_results)
+
+    def submit(self, task, on_done=None, on_error=None, on_progress=None):
+        """排入工作 task(conn, progress)，progress(message) 回報進度並檢查是否已取消"""
+        self.requests.put((task, on_done, on_error, on_progress))
+
+    def cancel(self):
+        """取消目前執行中的工作"""
+        self.cancel_event.set()
+
+    def stop(self):
+        self.requests.put(None)
+
+    def run(self):
+        conn = connect_database(self.db_path, self.db_profile)
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            task, on_done, on_error, on_progress = request
+            self.cancel_event.clear()
+
+            def progress(message, on_progress=on_progress):
+                if self.cancel_event.is_set():
+                    raise OperationCancelled()
+                if on_progress:
+                    self.results.put((on_progress, message))
+
+            try:
+                result = task(conn, progress)
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                self.results.put((on_error, e))
+            else:
+                self.results.put((on_done, result))
+        conn.close()
+
+    def poll_results(self):
+        """在 Tk 主執行緒中處理背景工作的結果
+
+        回呼函式發生例外時只回報該筆結果，不影響之後的結果與輪詢
+        """
+        try:
+            while True:
+                try:
+                    callback, value = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                if not callback:
+                    continue
+                try:
+                    callback(value)
+                except Exception as e:
+                    print(f"[背景] 處理工作結果失敗: {e}")
+                    traceback.print_exc()
+        finally:
+            self.root.after(self.POLL_INTERVAL, self.poll_results)
 
 class SkillTreeManager:
     
     #===========================================
     #  Initial 
     #===========================================
-    def __init__(self, root):
+    def __init__(self, root, lazy_load=False, db_profile=None, profiler=None):
+        startup_time = time.perf_counter()
         self.root = root
+        self.profiler = profiler or StartupProfiler()
+        # 延遲載入：啟動時只建立人員節點，展開時才從資料庫載入子節點
+        self.lazy_load = lazy_load
+        # 樹狀節點 ID -> NodeInfo，讓事件處理不需沿著父節點回推路徑
+        self.node_info = {}
+        # 人員姓名 -> persons.id，載入時建立，新增/刪除/匯入人員時同步更新
+        self.person_ids = {}
+        # 技能節點 -> 已排序的年份鍵 [(period_key, year_period), ...]，與樹中年份子節點順序一致
+        self.year_keys = {}
         self.root.title("技能樹管理系統 V1.11")
 
-        # 載入技能類型定義
-        with open('skill_type.json', 'r', encoding='utf-8') as f:
-            self.skill_types = json.load(f)
-        
-        # 建立資料庫連接
-        self.conn = sqlite3.connect('skills.db')
-        self.create_tables()
-        
-        self.setup_gui()
-        # 載入已存在的資料
-        self.load_existing_data()
+        # 建立資料庫連接，並套用連線設定 (journal、synchronous、快取等)；
+        # 所有 SQL 由 repository 執行，重複使用同一 cursor 與已編譯的敘述
+        with self.profiler.phase('create_tables'):
+            self.repo = SkillRepository(connect_database('skills.db', db_profile))
+            self.conn = self.repo.conn
+            self.create_tables()
+
+        # 載入技能類型定義：skill_type.json 沒有變更時直接從資料庫讀取，不重新解析
+        with self.profiler.phase('load_skill_types'):
+            self.catalog = SkillTypeCatalog(self.conn, 'skill_type.json')
+            self.skill_types = self.catalog.load()
+        # 編輯透過 journal 執行：可復原/重做，並合併為定期或手動 (儲存) 的一次 commit
+        self.journal = EditJournal(self.repo, log=self.profiler.log)
+
+        # 載入、匯入、匯出、查詢等較耗時的資料庫工作交給背景執行緒，避免畫面凍結
+        self.db_worker = DatabaseWorker(self.root, 'skills.db', db_profile)
+        self.pending_tasks = 0
+        # 執行中的寫入工作 (匯入) 數：期間背景連線持有寫入鎖，主執行緒不存取資料庫
+        self.write_tasks = 0
+        
+        with self.profiler.phase('setup_gui'):
+            self.setup_gui()
+        self.profiler.watch_tree('tree', self.tree)
+        self.profiler.watch_tree('result_tree', self.result_tree)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(JOURNAL_COMMIT_INTERVAL, self.autosave)
+        self.root.after(CATALOG_POLL_INTERVAL, self.poll_skill_types)
+        # 載入已存在的資料 (非延遲載入時，查詢與建立樹狀圖在完成後另外記錄)
+        with self.profiler.phase('load_existing_data'):
+            self.load_existing_data()
 
         self.selected_item = None  # 追踪當前選中的項目
+        self.profiler.log(f"[啟動] 總計 {time.perf_counter() - startup_time:.3f}s")
 
         # 配置 Treeview 樣式以支援多行文字
         #style = ttk.Style()
@@ -35,82 +291,312 @@ class SkillTreeManager:
         #style.configure('Treeview.Heading', font=('TkDefaultFont', 9, 'bold'))  # 設定標題樣式
 
     def create_tables(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS persons (
-                id INTEGER PRIMARY KEY,
-                name TEXT UNIQUE
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS skills (
-                id INTEGER PRIMARY KEY,
-                person_id INTEGER,
-                skill_category TEXT,
-                skill_name TEXT,
-                year_period TEXT,
-                skill_level INTEGER,
-                experience TEXT,
-                FOREIGN KEY (person_id) REFERENCES persons(id)
-            )
-        ''')
-        self.conn.commit()
+        self.repo.create_schema()
 
     def load_existing_data(self):
-        cursor = self.conn.cursor()
-    
-        # 載入所有人員
-        cursor.execute("SELECT name FROM persons")
-        persons = cursor.fetchall()
-    
-        # 為每個人建立技能樹
-        for person in persons:
-            person_name = person[0]
-            person_item = self.tree.insert('', 'end', person_name, text=person_name)
-        
-            # 載入該人員的所有技能，按照類別、技能名稱排序
-            cursor.execute("""
-                SELECT skill_category, skill_name, year_period, skill_level, experience
-                FROM skills
-                JOIN persons ON skills.person_id = persons.id
-                WHERE persons.name = ?
-                ORDER BY skill_category, skill_name, 
-                    CASE 
-                        WHEN year_period LIKE '%H2' THEN year_period || '2'
-                        WHEN year_period LIKE '%H1' THEN year_period || '1'
-                        ELSE year_period
-                    END
-            """, (person_name,))
-        
-            skills = cursor.fetchall()
-            categories = {}
-            skill_nodes = {}
-        
-            for skill in skills:
-                category, skill_name, year_period, level, experience = skill
-            
-                # 建立分類節點
-                category_id = f"{person_name}_{category}"
-                if category_id not in categories:
-                    categories[category_id] = self.tree.insert(person_name, 'end', category_id, text=category)
-            
-                # 建立技能節點
-                skill_id = f"{category_id}_{skill_name}"
-                if skill_id not in skill_nodes:
-                    skill_nodes[skill_id] = self.tree.insert(category_id, 'end', skill_id, text=skill_name)
-            
-                # 建立年份和詳細資訊節點
-                year_id = f"{skill_id}_{year_period}"
-                year_node = self.tree.insert(skill_id, 'end', year_id, text=year_period)
-                self.tree.insert(year_id, 'end', f"{year_id}_level", text=f"技能等級: {level}")
-                if experience:  # 只有在有經驗描述時才添加節點
-                    self.tree.insert(year_id, 'end', f"{year_id}_exp", text=f"技能經驗: {experience}")
+        """以單一查詢載入所有人員與技能，一次建立整棵技能樹"""
+        self.node_info = {}
+        self.year_keys = {}
+        self.person_ids = {}
+        if self.lazy_load:
+            self.load_person_nodes()
+            return
+
+        start_time = time.perf_counter()
+
+        def query(conn, progress):
+            # 一次取出所有人員及其技能，依人員、類別、技能名稱、年份排序鍵排序
+            # 使用 LEFT JOIN 讓尚未有技能的人員也會出現在樹中
+            return SkillRepository(conn).tree_rows()
+
+        def build_tree(rows):
+            query_time = time.perf_counter()
+            person_count, skill_count = self.insert_skill_rows(rows)
+
+            end_time = time.perf_counter()
+            self.profiler.add_phase('load_existing_data (查詢)', query_time - start_time)
+            self.profiler.add_phase('load_existing_data (建立樹)', end_time - query_time)
+            self.profiler.log(f"[載入] {person_count} 位人員, {skill_count} 筆技能資料 | "
+                              f"查詢 {query_time - start_time:.3f}s, "
+                              f"建立樹狀圖 {end_time - query_time:.3f}s, "
+                              f"總計 {end_time - start_time:.3f}s")
+
+        self.run_in_background("載入資料中...", query, build_tree, "載入失敗")
+
+    def run_in_background(self, message, task, on_done, error_message, writes=False, flush=True):
+        """在資料庫背景執行緒執行 task(conn, progress)，完成後於主執行緒呼叫 on_done(result)
+
+        執行期間在狀態列顯示進度，並可按「取消」中止。
+        writes 為 True 的工作 (匯入) 在整個交易期間持有寫入鎖，期間暫停編輯與載入節點。
+        不需要讀到最新編輯的工作 (輸入中的全文搜尋、查詢換頁) 以 flush=False 略過提交
+        """
+        # 背景執行緒使用另一個連線，只看得到已提交的資料
+        if flush:
+            self.journal.flush()
+        self.pending_tasks += 1
+        self.write_tasks += writes
+        self.status_label['text'] = message
+        self.progress_bar.start(10)
+        self.cancel_button['state'] = 'normal'
+
+        def finish(status):
+            self.pending_tasks -= 1
+            self.write_tasks -= writes
+            if self.pending_tasks == 0:
+                self.progress_bar.stop()
+                self.cancel_button['state'] = 'disabled'
+            self.status_label['text'] = status
+
+        def done(result):
+            finish("就緒")
+            on_done(result)
+
+        def failed(error):
+            if isinstance(error, OperationCancelled):
+                finish("已取消")
+            else:
+                finish(error_message)
+                messagebox.showerror("錯誤", f"{error_message}: {str(error)}")
+
+        def progress(text):
+            self.status_label['text'] = text
+
+        self.db_worker.submit(task, done, failed, progress)
+
+    def database_busy(self, notify=True):
+        """背景匯入持有寫入鎖時回傳 True
+
+        此時主執行緒的查詢與編輯會等待 busy_timeout 後以 database is locked 失敗，
+        因此先提示使用者，匯入完成後再操作；notify 為 False 時只顯示在狀態列
+        """
+        if not self.write_tasks:
+            return False
+        if notify:
+            messagebox.showinfo("請稍候", "匯入進行中，完成後才能編輯資料")
+        else:
+            self.status_label['text'] = "匯入進行中，完成後才能載入或編輯資料"
+        return True
+
+    def cancel_background_task(self):
+        """取消目前執行中的背景工作"""
+        self.db_worker.cancel()
+
+    def insert_skill_rows(self, rows, create_persons=True):
+        """依已排序的 (人員, 分類, 技能, 年份) 資料列，單次掃描建立樹狀節點
+
+        create_persons 為 False 時人員節點須已存在，只建立其下的子節點
+        回傳 (人員數, 技能資料筆數)
+        """
+        current_person = None
+        current_category_id = None
+        current_skill_id = None
+        person_count = 0
+        skill_count = 0
+
+        for (person_id, person_name, row_id, category, skill_name,
+             year_period, period_key, level, experience) in rows:
+            # 建立人員節點（結果已依人員排序，只需與上一列比較）
+            if person_name != current_person:
+                if create_persons:
+                    self.insert_person_node(person_name, person_id)
+                current_person = person_name
+                current_category_id = None
+                current_skill_id = None
+                person_count += 1
+
+            # 沒有技能的人員只會有一列 NULL 資料
+            if category is None:
+                continue
+
+            # 建立分類節點
+            category_id = f"{person_name}_{category}"
+            if category_id != current_category_id:
+                self.insert_category_node(person_name, category)
+                current_category_id = category_id
+                current_skill_id = None
+
+            # 建立技能節點
+            skill_id = f"{category_id}_{skill_name}"
+            if skill_id != current_skill_id:
+                self.insert_skill_node(category_id, skill_name)
+                current_skill_id = skill_id
+
+            # 建立年份和詳細資訊節點
+            self.insert_year_node(skill_id, year_period, period_key, level, experience, row_id)
+            skill_count += 1
+
+        return person_count, skill_count
+
+    def load_person_nodes(self):
+        """延遲載入模式：只建立人員節點，有技能資料者加上佔位子節點"""
+        start_time = time.perf_counter()
+        rows = self.repo.person_nodes()
+
+        for person_id, person_name, has_skills in rows:
+            self.insert_person_node(person_name, person_id)
+            if has_skills:
+                self.insert_placeholder(person_name)
+
+        self.profiler.log(f"[載入] {len(rows)} 位人員 (延遲載入) | "
+                          f"總計 {time.perf_counter() - start_time:.3f}s")
+
+    def insert_placeholder(self, node):
+        """插入佔位子節點，讓尚未載入的節點可以展開"""
+        self.tree.insert(node, 'end', f"{PLACEHOLDER_PREFIX}{node}", text="載入中...")
+
+    def has_placeholder(self, node):
+        """節點是否仍為尚未載入（只有佔位子節點）的狀態"""
+        return self.tree.exists(f"{PLACEHOLDER_PREFIX}{node}")
+
+    def on_tree_open(self, event):
+        """展開節點時，若子節點尚未載入則從資料庫取得"""
+        item = self.tree.focus()
+        if not item or not self.has_placeholder(item):
+            return
+        # 匯入中無法讀取，保留佔位節點並收合，完成後再展開即可載入
+        if self.database_busy(notify=False):
+            self.tree.item(item, open=False)
+            return
+
+        info = self.node_info[item]
+        try:
+            if info.kind == 'person':  # 人員：載入技能分類
+                rows = self.repo.person_categories(info.person_id)
+            elif info.kind == 'category':  # 分類：載入技能名稱
+                rows = self.repo.category_skills(info.person_id, info.category)
+            else:  # 技能：載入年份和詳細資訊
+                rows = self.repo.skill_years(info.person_id, info.category, info.skill_name)
+        except sqlite3.OperationalError as e:
+            self.tree.item(item, open=False)
+            messagebox.showerror("錯誤", f"載入失敗: {str(e)}")
+            return
+
+        self.tree.delete(f"{PLACEHOLDER_PREFIX}{item}")
+        if info.kind == 'person':
+            for category in rows:
+                category_id = self.insert_category_node(item, category)
+                self.insert_placeholder(category_id)
+
+        elif info.kind == 'category':
+            for skill_name in rows:
+                skill_id = self.insert_skill_node(item, skill_name)
+                self.insert_placeholder(skill_id)
+
+        elif info.kind == 'skill':
+            self.year_keys[item] = []
+            for row_id, year_period, period_key, level, experience in rows:
+                self.insert_year_node(item, year_period, period_key, level, experience, row_id)
+
+    def insert_person_node(self, person_name, person_id):
+        """插入人員節點並記錄節點資訊"""
+        self.tree.insert('', 'end', person_name, text=person_name)
+        self.node_info[person_name] = NodeInfo('person', person_name, person_id, None, None, None, None)
+        self.person_ids[person_name] = person_id
+        return person_name
+
+    def insert_category_node(self, person_node, category, index='end'):
+        """在人員節點下插入分類節點並記錄節點資訊"""
+        category_id = f"{person_node}_{category}"
+        self.tree.insert(person_node, index, category_id, text=category)
+        self.node_info[category_id] = self.node_info[person_node]._replace(
+            kind='category', category=category)
+        return category_id
+
+    def insert_skill_node(self, category_node, skill_name, index='end'):
+        """在分類節點下插入技能節點並記錄節點資訊"""
+        skill_id = f"{category_node}_{skill_name}"
+        self.tree.insert(category_node, index, skill_id, text=skill_name)
+        self.node_info[skill_id] = self.node_info[category_node]._replace(
+            kind='skill', skill_name=skill_name)
+        self.year_keys[skill_id] = []
+        return skill_id
+
+    def insert_year_node(self, skill_node, year_period, period_key, level, experience, row_id):
+        """在技能節點下依年份順序插入年份節點及其等級、經驗子節點
+
+        以快取的已排序年份鍵二分搜尋插入位置，不需讀取樹中既有的年份節點
+        """
+        keys = self.year_keys.setdefault(skill_node, [])
+        key = (period_key or 0, year_period)
+        index = bisect.bisect_left(keys, key)
+        keys.insert(index, key)
+
+        year_id = f"{skill_node}_{year_period}"
+        year_info = self.node_info[skill_node]._replace(
+            kind='year', year_period=year_period, row_id=row_id)
+        self.tree.insert(skill_node, index, year_id, text=year_period)
+        self.node_info[year_id] = year_info
+        self.tree.insert(year_id, 'end', f"{year_id}_level", text=f"技能等級: {level}")
+        self.node_info[f"{year_id}_level"] = year_info._replace(kind='level')
+        if experience:  # 只有在有經驗描述時才添加節點
+            self.insert_experience_node(year_id, experience)
+        return year_id
+
+    def insert_experience_node(self, year_node, experience):
+        """在年份節點下插入技能經驗節點"""
+        exp_id = f"{year_node}_exp"
+        self.tree.insert(year_node, 'end', exp_id, text=f"技能經驗: {experience}")
+        self.node_info[exp_id] = self.node_info[year_node]._replace(kind='exp')
+        return exp_id
+
+    def remove_year_key(self, skill_node, year_period):
+        """年份節點刪除後，同步移除快取中的年份鍵"""
+        keys = self.year_keys.get(skill_node)
+        if keys is None:
+            return
+        key = (period_sort_key(year_period) or 0, year_period)
+        index = bisect.bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            del keys[index]
+
+    def delete_tree_node(self, node):
+        """從樹中刪除節點，並清除其子樹的節點資訊與年份鍵快取"""
+        self.delete_tree_nodes([node])
+
+    def delete_tree_nodes(self, nodes):
+        """以一次 tree.delete 刪除多個節點 (彼此不可為祖先與子孫)"""
+        pending = list(nodes)
+        while pending:
+            current = pending.pop()
+            self.node_info.pop(current, None)
+            self.year_keys.pop(current, None)
+            pending.extend(self.tree.get_children(current))
+        self.tree.delete(*nodes)
+
+    def on_tree_close(self, event):
+        """收合節點時釋放其子樹，改回佔位子節點，避免長時間使用後節點無限增長"""
+        if not self.lazy_load:
+            return
+
+        item = self.tree.focus()
+        info = self.node_info.get(item)
+        # 年份節點以下的資料隨年份節點一起載入，不需釋放
+        if info is None or info.kind not in ('person', 'category', 'skill'):
+            return
+        if self.has_placeholder(item) or len(self.tree.get_children(item)) == 0:
+            return
+
+        for child in self.tree.get_children(item):
+            self.delete_tree_node(child)
+        self.year_keys[item] = []
+        self.insert_placeholder(item)
 
     #===========================================
     #  View 
     #===========================================
     def setup_gui(self):
+        # 狀態列：顯示背景工作進度，可取消執行中的工作
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=2)
+
+        self.status_label = ttk.Label(status_frame, text="就緒", anchor=tk.W)
+        self.status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.cancel_button = ttk.Button(status_frame, text="取消", command=self.cancel_background_task)
+        self.cancel_button.pack(side=tk.RIGHT, padx=5)
+        self.cancel_button['state'] = 'disabled'
+        self.progress_bar = ttk.Progressbar(status_frame, mode='indeterminate', length=150)
+        self.progress_bar.pack(side=tk.RIGHT, padx=5)
+
         # 建立分頁
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True)
@@ -132,26 +618,41 @@ class SkillTreeManager:
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="檔案", menu=file_menu)
         file_menu.add_command(label="匯出JSON", command=self.export_json)
+        file_menu.add_command(label="匯出JSON (精簡)", command=lambda: self.export_json(compact=True))
         file_menu.add_command(label="匯入JSON", command=self.import_json)
         file_menu.add_separator()
         file_menu.add_command(label="匯出MM", command=self.export_mm)
+        file_menu.add_command(label="匯出MM (全部人員)", command=self.export_mm_all)
+        file_menu.add_command(label="批次匯出MM (每人一檔)", command=self.export_mm_batch)
         file_menu.add_separator()
         file_menu.add_command(label="刪除所選項目", command=self.delete_selected)
+
+        # 編輯選單
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="編輯", menu=edit_menu)
+        edit_menu.add_command(label="復原", accelerator="Ctrl+Z", command=self.undo)
+        edit_menu.add_command(label="重做", accelerator="Ctrl+Y", command=self.redo)
         
         
         # 右鍵選單
         self.context_menu = tk.Menu(self.root, tearoff=0)
         self.context_menu.add_command(label="刪除", command=self.delete_selected)
+        self.context_menu.add_command(label="設定所選等級", command=self.set_selected_level)
 
         # 左側面板 - 技能樹顯示
         left_frame = ttk.Frame(main_frame)
         left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         # 技能樹 Treeview
-        self.tree = ttk.Treeview(left_frame)
+        # 可用 Ctrl/Shift 多選，刪除與設定等級會一次套用到所有選取的節點
+        self.tree = ttk.Treeview(left_frame, selectmode='extended')
         self.tree.pack(fill=tk.BOTH, expand=True)
         self.tree.bind('<<TreeviewSelect>>', self.on_tree_select)
+        self.tree.bind('<<TreeviewOpen>>', self.on_tree_open)
+        self.tree.bind('<<TreeviewClose>>', self.on_tree_close)
         self.tree.bind("<Button-3>", self.show_context_menu)
+        self.tree.bind('<Control-z>', lambda event: self.undo())
+        self.tree.bind('<Control-y>', lambda event: self.redo())
 
         # 右側面板 - 操作區
         right_frame = ttk.Frame(main_frame)
@@ -207,6 +708,7 @@ class SkillTreeManager:
         self.add_year_button['state'] = 'disabled'  # 初始時停用
 
         ttk.Button(button_frame, text="更新技能", command=self.update_skill).pack(side=tk.LEFT, padx=5) 
+        ttk.Button(button_frame, text="設定所選等級", command=self.set_selected_level).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="儲存", command=self.save_data).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="匯入JSON", command=self.import_json).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="匯出JSON", command=self.export_json).pack(side=tk.LEFT, padx=5)
@@ -219,7 +721,9 @@ class SkillTreeManager:
         """顯示右鍵選單"""
         item = self.tree.identify_row(event.y)
         if item:
-            self.tree.selection_set(item)
+            # 在已選取的節點上按右鍵時保留多選
+            if item not in self.tree.selection():
+                self.tree.selection_set(item)
             self.context_menu.post(event.x_root, event.y_root)
 
     def update_skill(self):
@@ -229,69 +733,41 @@ class SkillTreeManager:
             return
         
         selected_item = selected[0]
-        item_text = self.tree.item(selected_item)['text']
-        parent = self.tree.parent(selected_item)
-    
-        # 找到技能的完整路徑
-        path = []
-        current = selected_item
-        while current:
-            path.insert(0, self.tree.item(current)['text'])
-            current = self.tree.parent(current)
+        info = self.node_info.get(selected_item)
     
         # 確保選擇的是年份節點
-        if len(path) != 4:  # 人員/分類/技能名稱/年份
+        if info is None or info.kind != 'year':  # 人員/分類/技能名稱/年份
             messagebox.showerror("錯誤", "請選擇要更新的技能年份節點")
             return
     
-        person_name = path[0]
-        category = path[1]
-        skill_name = path[2]
-        year_period = path[3]
-    
+        if self.database_busy():
+            return
+
         # 取得新的技能等級和經驗
         new_level = self.level_spinbox.get()
         new_experience = self.experience_text.get("1.0", tk.END).strip()
     
         try:
-            cursor = self.conn.cursor()
-        
-            # 取得person_id
-            cursor.execute("SELECT id FROM persons WHERE name=?", (person_name,))
-            person_id = cursor.fetchone()[0]
-        
             # 更新資料庫
-            cursor.execute("""
-                UPDATE skills 
-                SET skill_level = ?, experience = ?
-                WHERE person_id = ? 
-                AND skill_category = ? 
-                AND skill_name = ? 
-                AND year_period = ?
-            """, (new_level, new_experience, person_id, category, skill_name, year_period))
-        
-            self.conn.commit()
+            self.journal.update_skill(info.row_id, new_level, new_experience)
         
             # 更新樹狀圖顯示
             year_id = selected_item
             level_id = f"{year_id}_level"
             exp_id = f"{year_id}_exp"
         
-            # 更新或創建等級節點
-            if self.tree.exists(level_id):
-                self.tree.item(level_id, text=f"技能等級: {new_level}")
-            else:
-                self.tree.insert(year_id, 'end', level_id, text=f"技能等級: {new_level}")
+            # 更新等級節點
+            self.tree.item(level_id, text=f"技能等級: {new_level}")
         
             # 更新或創建經驗節點
             if new_experience:
                 if self.tree.exists(exp_id):
                     self.tree.item(exp_id, text=f"技能經驗: {new_experience}")
                 else:
-                    self.tree.insert(year_id, 'end', exp_id, text=f"技能經驗: {new_experience}")
+                    self.insert_experience_node(year_id, new_experience)
             else:
                 if self.tree.exists(exp_id):
-                    self.tree.delete(exp_id)
+                    self.delete_tree_node(exp_id)
         
             messagebox.showinfo("成功", "技能資料已更新")
         
@@ -304,145 +780,146 @@ class SkillTreeManager:
         if not selected:
             messagebox.showinfo("提示", "請先選擇要刪除的項目")
             return
+        if self.database_busy():
+            return
+        if len(selected) > 1:
+            self.delete_selection(self.top_selected_nodes())
+            return
 
         item = selected[0]
+        info = self.node_info.get(item)
+        if info is None:
+            return
         item_text = self.tree.item(item)['text']
     
         # 確認是否要刪除
-        if not messagebox.askyesno("確認刪除", f"確定要刪除 '{item_text}' 嗎？\n這個操作無法復原。"):
+        if not messagebox.askyesno("確認刪除", f"確定要刪除 '{item_text}' 嗎？\n可從「編輯 > 復原」還原。"):
             return
 
         try:
-            # 開始交易
-            self.conn.execute("BEGIN TRANSACTION")
-        
-            # 修正這行，移除額外的參數
-            depth = len(self.tree.get_children(item))
-            parent = self.tree.parent(item)
-        
-            # 查找根節點（人員名稱）
-            root_item = item
-            while self.tree.parent(root_item):
-                root_item = self.tree.parent(root_item)
-            person_name = self.tree.item(root_item)['text']
-        
-            cursor = self.conn.cursor()
-        
-            # 取得 person_id
-            cursor.execute("SELECT id FROM persons WHERE name = ?", (person_name,))
-            person_id = cursor.fetchone()[0]
-        
-            # 依據不同層級執行不同的刪除邏輯
-            if parent == '':  # 第一層：刪除人員
-                cursor.execute("DELETE FROM persons WHERE name = ?", (item_text,))
-                cursor.execute("DELETE FROM skills WHERE person_id = ?", (person_id,))
-                self.tree.delete(item)
-            
-            else:
-                # 解析項目的完整路徑
-                path = []
-                current = item
-                while current:
-                    path.insert(0, self.tree.item(current)['text'])
-                    current = self.tree.parent(current)
-            
-                if len(path) == 2:  # 第二層：刪除某分類下的所有技能
-                    cursor.execute("""
-                        DELETE FROM skills 
-                        WHERE person_id = ? AND skill_category = ?
-                    """, (person_id, item_text))
-                    self.tree.delete(item)
-                
-                elif len(path) == 3:  # 第三層：刪除特定技能
-                    cursor.execute("""
-                        DELETE FROM skills 
-                        WHERE person_id = ? 
-                        AND skill_category = ? 
-                        AND skill_name = ?
-                    """, (person_id, path[1], item_text))
-                    self.tree.delete(item)
-                
-                elif len(path) == 4:  # 第四層：刪除特定年份的技能記錄
-                    cursor.execute("""
-                        DELETE FROM skills 
-                        WHERE person_id = ? 
-                        AND skill_category = ? 
-                        AND skill_name = ? 
-                        AND year_period = ?
-                    """, (person_id, path[1], path[2], item_text))
-                    self.tree.delete(item)
-                
-                elif len(path) == 5:  # 第五層：刪除技能等級或經驗
-                    # 取得完整的技能記錄
-                    cursor.execute("""
-                        SELECT id, skill_level, experience 
-                        FROM skills 
-                        WHERE person_id = ? 
-                        AND skill_category = ? 
-                        AND skill_name = ? 
-                        AND year_period = ?
-                    """, (person_id, path[1], path[2], path[3]))
-                    skill_record = cursor.fetchone()
-                
-                    if skill_record:
-                        if "技能等級" in item_text:
-                            # 如果刪除技能等級，整條記錄都要刪除
-                            cursor.execute("DELETE FROM skills WHERE id = ?", (skill_record[0],))
-                            self.tree.delete(self.tree.parent(item))
-                        elif "技能經驗" in item_text:
-                            # 如果刪除技能經驗，只更新經驗欄位為空
-                            cursor.execute("""
-                                UPDATE skills 
-                                SET experience = '' 
-                                WHERE id = ?
-                            """, (skill_record[0],))
-                            self.tree.delete(item)
-        
-            # 提交交易
-            self.conn.commit()
+            # 同一個操作的刪除記為一筆可復原的記錄，失敗時只回滾這次刪除
+            with self.journal.record(f"刪除 '{item_text}'"):
+                # 依據不同層級執行不同的刪除邏輯
+                if info.kind == 'person':  # 第一層：刪除人員
+                    self.journal.delete_person(info.person_id)
+                    self.delete_tree_node(item)
+                    self.person_ids.pop(info.person_name, None)
+
+                elif info.kind == 'category':  # 第二層：刪除某分類下的所有技能
+                    self.journal.delete_category(info.person_id, info.category)
+                    self.delete_tree_node(item)
+
+                elif info.kind == 'skill':  # 第三層：刪除特定技能
+                    self.journal.delete_skill(info.person_id, info.category, info.skill_name)
+                    self.delete_tree_node(item)
+
+                elif info.kind == 'year':  # 第四層：刪除特定年份的技能記錄
+                    self.journal.delete_skill_row(info.row_id)
+                    skill_node = f"{info.person_name}_{info.category}_{info.skill_name}"
+                    self.remove_year_key(skill_node, info.year_period)
+                    self.delete_tree_node(item)
+
+                elif info.kind == 'level':  # 第五層：刪除技能等級，整條記錄都要刪除
+                    self.journal.delete_skill_row(info.row_id)
+                    skill_node = f"{info.person_name}_{info.category}_{info.skill_name}"
+                    self.remove_year_key(skill_node, info.year_period)
+                    self.delete_tree_node(f"{skill_node}_{info.year_period}")
+
+                elif info.kind == 'exp':  # 第五層：刪除技能經驗，只更新經驗欄位為空
+                    self.journal.clear_experience(info.row_id)
+                    self.delete_tree_node(item)
+
             messagebox.showinfo("成功", "刪除成功")
-        
+
         except Exception as e:
-            # 發生錯誤時回滾交易
-            self.conn.rollback()
             messagebox.showerror("錯誤", f"刪除失敗: {str(e)}")
 
-    def export_json(self):
-        """匯出所有資料為 JSON 格式"""
-        cursor = self.conn.cursor()
-        
-        # 取得所有人員資料
-        cursor.execute("SELECT id, name FROM persons")
-        persons = cursor.fetchall()
-        
-        export_data = {}
-        
-        for person_id, person_name in persons:
-            # 取得該人員的所有技能
-            cursor.execute("""
-                SELECT skill_category, skill_name, year_period, skill_level, experience
-                FROM skills
-                WHERE person_id = ?
-                ORDER BY skill_category, skill_name, year_period
-            """, (person_id,))
-            
-            skills = cursor.fetchall()
-            
-            # 組織該人員的技能資料
-            person_skills = []
-            for skill in skills:
-                category, name, year, level, exp = skill
-                skill_data = {
-                    "category": category,
-                    "name": name,
-                    "year": year,
-                    "level": level,
-                    "experience": exp if exp else ""
-                }
-                person_skills.append(skill_data)
-            
-            export_data[person_name] = person_skills
-        
+    def top_selected_nodes(self):
+        """目前選取的節點中祖先未被選取者 [(節點, NodeInfo), ...]，略過佔位節點"""
+        selected = set(self.tree.selection())
+        nodes = []
+        for item in self.tree.selection():
+            info = self.node_info.get(item)
+            if info is None:
+                continue
+            parent = self.tree.parent(item)
+            while parent and parent not in selected:
+                parent = self.tree.parent(parent)
+            if not parent:
+                nodes.append((item, info))
+        return nodes
+
+    def delete_selection(self, nodes):
+        """以一個交易刪除多選的節點，再一次從樹中移除"""
+        if not nodes or self.database_busy():
+            return
+        if not messagebox.askyesno("確認刪除", f"確定要刪除所選的 {len(nodes)} 個項目嗎？\n"
+                                               "可從「編輯 > 復原」還原。"):
+            return
+
+        # 經驗節點只清除經驗欄位，其他節點依 NodeInfo 的層級刪除整位人員、分類、技能或年份
+        selectors = [(info.person_id, info.category, info.skill_name, info.row_id)
+                     for node, info in nodes if info.kind != 'exp']
+        experience_row_ids = [info.row_id for node, info in nodes if info.kind == 'exp']
+        try:
+            count = self.journal.delete_selection(selectors, experience_row_ids)
+        except sqlite3.Error as e:
+            messagebox.showerror("錯誤", f"刪除失敗: {str(e)}")
+            return
+
+        tree_nodes = []
+        for node, info in nodes:
+            if info.kind == 'person':
+                self.person_ids.pop(info.person_name, None)
+            elif info.kind in ('year', 'level'):
+                skill_node = f"{info.person_name}_{info.category}_{info.skill_name}"
+                self.remove_year_key(skill_node, info.year_period)
+                node = f"{skill_node}_{info.year_period}"
+            tree_nodes.append(node)
+        self.delete_tree_nodes(tree_nodes)
+        messagebox.showinfo("成功", f"已刪除 {len(nodes)} 個項目 ({count} 筆技能資料)")
+
+    def set_selected_level(self):
+        """將所有選取節點範圍內的技能資料等級設為等級欄位的值"""
+        nodes = self.top_selected_nodes()
+        if not nodes:
+            messagebox.showerror("錯誤", "請先選擇要設定等級的項目")
+            return
+        if self.database_busy():
+            return
+        try:
+            level = int(self.level_spinbox.get())
+        except ValueError:
+            level = None
+        if level is None or not 0 <= level <= 5:
+            messagebox.showerror("錯誤", "技能等級必須是 0-5 的數字")
+            return
+
+        selectors = [(info.person_id, info.category, info.skill_name, info.row_id)
+                     for node, info in nodes]
+        try:
+            row_ids = set(self.journal.set_selection_level(selectors, level))
+        except sqlite3.Error as e:
+            messagebox.showerror("錯誤", f"設定等級失敗: {str(e)}")
+            return
+
+        # 只更新已載入的年份節點，延遲載入尚未展開的部分展開時會讀到新值
+        level_text = f"技能等級: {level}"
+        pending = [node for node, info in nodes]
+        while pending:
+            node = pending.pop()
+            info = self.node_info.get(node)
+            if info is None:
+                continue
+            if info.row_id is None:
+                pending.extend(self.tree.get_children(node))
+            elif info.row_id in row_ids:
+                level_node = f"{info.person_name}_{info.category}_{info.skill_name}_{info.year_period}_level"
+                self.tree.item(level_node, text=level_text)
+        messagebox.showinfo("成功", f"已將 {len(row_ids)} 筆技能資料的等級設為 {level}")
+
+    def export_json(self, compact=False):
+        """匯出所有資料為 JSON 格式，compact 為 True 時不縮排，供程式讀取"""
         # 選擇儲存位置
         file_path = filedialog.asksaveasfilename(
             defaultextension=".json",
@@ -451,12 +928,11 @@ class SkillTreeManager:
         )
         
         if file_path:
-            try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(export_data, f, ensure_ascii=False, indent=2)
-                messagebox.showinfo("成功", "資料已成功匯出為JSON格式")
-            except Exception as e:
-                messagebox.showerror("錯誤", f"匯出失敗: {str(e)}")
+            self.run_in_background(
+                "匯出中...",
+                lambda conn, progress: export_json_file(conn, file_path, compact, progress),
+                lambda result: messagebox.showinfo("成功", "資料已成功匯出為JSON格式"),
+                "匯出失敗")
 
     def import_json(self):
         """從 JSON 檔案匯入資料"""
@@ -468,51 +944,133 @@ class SkillTreeManager:
         if not file_path:
             return
         
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                import_data = json.load(f)
-            
-            cursor = self.conn.cursor()
-            
-            # 開始交易
-            self.conn.execute("BEGIN TRANSACTION")
-            
-            try:
-                for person_name, skills in import_data.items():
-                    # 新增或取得人員ID
-                    cursor.execute("INSERT OR IGNORE INTO persons (name) VALUES (?)", (person_name,))
-                    cursor.execute("SELECT id FROM persons WHERE name=?", (person_name,))
-                    person_id = cursor.fetchone()[0]
-                    
-                    # 新增技能
-                    for skill in skills:
-                        cursor.execute("""
-                            INSERT INTO skills 
-                            (person_id, skill_category, skill_name, year_period, skill_level, experience)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                        """, (person_id, 
-                             skill['category'],
-                             skill['name'],
-                             skill['year'],
-                             skill['level'],
-                             skill['experience']))
-                
-                # 提交交易
-                self.conn.commit()
-                
-                # 重新載入顯示
-                self.tree.delete(*self.tree.get_children())
-                self.load_existing_data()
-                
-                messagebox.showinfo("成功", "資料已成功匯入")
-                
-            except Exception as e:
-                # 發生錯誤時回滾交易
-                self.conn.rollback()
-                raise e
-                
-        except Exception as e:
-            messagebox.showerror("錯誤", f"匯入失敗: {str(e)}")
+        def on_imported(imported_persons):
+            # 匯入的資料不在編輯記錄中，之前的操作無法再安全地復原
+            self.journal.clear()
+            # 只更新有匯入資料的人員子樹，不重建整棵樹
+            self.person_ids.update(imported_persons)
+            self.refresh_person_nodes(imported_persons)
+            messagebox.showinfo("成功", "資料已成功匯入")
+
+        self.run_in_background(
+            "匯入中...",
+            lambda conn, progress: import_json_file(conn, file_path, progress=progress),
+            on_imported,
+            "匯入失敗",
+            writes=True)
+
+    def refresh_person_nodes(self, person_names):
+        """依資料庫比對指定人員的子樹，只新增、更新或刪除有差異的節點
+
+        既有節點不會重建，因此使用者的展開與選取狀態都會保留；
+        不存在的人員則新增節點
+        """
+        refresh_names = []
+        for person_name in person_names:
+            if not self.tree.exists(person_name):
+                self.insert_person_node(person_name, self.person_ids[person_name])
+            elif self.has_placeholder(person_name):
+                # 延遲載入且尚未展開，展開時就會從資料庫取得最新資料
+                continue
+            refresh_names.append(person_name)
+
+        if not refresh_names:
+            return
+
+        # 分批以 id IN (...) 查出所有受影響人員的資料 (只有 SELECT，不開啟交易)
+        rows = self.repo.persons_rows(self.person_ids[person_name] for person_name in refresh_names)
+
+        # 人員 -> 分類 -> 技能 -> 年份 -> (id, period_key, 等級, 經驗)
+        skills_by_person = {}
+        for person_name, row_id, category, skill_name, year_period, period_key, level, experience in rows:
+            skills_by_person.setdefault(person_name, {}).setdefault(category, {}).setdefault(
+                skill_name, {})[year_period] = (row_id, period_key, level, experience)
+
+        for person_name in refresh_names:
+            categories = skills_by_person.get(person_name, {})
+            if self.lazy_load and categories and not self.tree.get_children(person_name):
+                # 延遲載入模式下尚未載入過的人員 (新增或原本沒有技能)，展開時再載入
+                self.insert_placeholder(person_name)
+                continue
+            self.patch_child_nodes(person_name, categories)
+
+    def patch_child_nodes(self, node, children):
+        """將人員、分類或技能節點的子節點與資料庫內容比對後就地更新
+
+        children 為該節點以下的資料 (分類 -> 技能 -> 年份 的巢狀 dict)；
+        延遲載入模式下仍為佔位狀態的子樹不需比對，展開時會載入最新資料
+        """
+        info = self.node_info[node]
+        if info.kind == 'skill':
+            self.patch_year_nodes(node, children)
+            return
+
+        existing = {}
+        for child in self.tree.get_children(node):
+            child_info = self.node_info.get(child)
+            if child_info is None:  # 佔位節點
+                continue
+            name = child_info.category if child_info.kind == 'category' else child_info.skill_name
+            existing[name] = child
+
+        # 刪除資料庫中已不存在的分類/技能
+        for name, child in existing.items():
+            if name not in children:
+                self.delete_tree_node(child)
+
+        for name, grandchildren in children.items():
+            child = existing.get(name)
+            if child is None:
+                # 依名稱順序插入新的分類/技能
+                siblings = [self.tree.item(sibling, 'text') for sibling in self.tree.get_children(node)]
+                index = bisect.bisect_left(siblings, name)
+                if info.kind == 'person':
+                    child = self.insert_category_node(node, name, index)
+                else:
+                    child = self.insert_skill_node(node, name, index)
+                if self.lazy_load:
+                    self.insert_placeholder(child)
+                    continue
+            elif self.has_placeholder(child):
+                continue
+            self.patch_child_nodes(child, grandchildren)
+
+    def patch_year_nodes(self, skill_node, years):
+        """比對技能節點下的年份節點，更新等級與經驗，新增或刪除有差異的年份"""
+        for year_id in self.tree.get_children(skill_node):
+            year_info = self.node_info.get(year_id)
+            if year_info is None:  # 佔位節點
+                continue
+            year_period = year_info.year_period
+            if year_period not in years:
+                self.delete_tree_node(year_id)
+                self.remove_year_key(skill_node, year_period)
+                continue
+
+            row_id, period_key, level, experience = years.pop(year_period)
+            if year_info.row_id != row_id:
+                for suffix in ('', '_level', '_exp'):
+                    if f"{year_id}{suffix}" in self.node_info:
+                        self.node_info[f"{year_id}{suffix}"] = self.node_info[
+                            f"{year_id}{suffix}"]._replace(row_id=row_id)
+
+            level_text = f"技能等級: {level}"
+            if self.tree.item(f"{year_id}_level", 'text') != level_text:
+                self.tree.item(f"{year_id}_level", text=level_text)
+
+            exp_id = f"{year_id}_exp"
+            if experience:
+                exp_text = f"技能經驗: {experience}"
+                if not self.tree.exists(exp_id):
+                    self.insert_experience_node(year_id, experience)
+                elif self.tree.item(exp_id, 'text') != exp_text:
+                    self.tree.item(exp_id, text=exp_text)
+            elif self.tree.exists(exp_id):
+                self.delete_tree_node(exp_id)
+
+        # 剩下的是新的年份
+        for year_period, (row_id, period_key, level, experience) in years.items():
+            self.insert_year_node(skill_node, year_period, period_key, level, experience, row_id)
 
 #    def on_tree_select(self, event):
 #        selected = self.tree.selection()
@@ -535,59 +1093,44 @@ class SkillTreeManager:
             return
         
         item = selected[0]
-        item_text = self.tree.item(item)['text']
-    
-        # 找到選中項目的完整路徑
-        path = []
-        current = item
-        while current:
-            path.insert(0, self.tree.item(current)['text'])
-            current = self.tree.parent(current)
+        info = self.node_info.get(item)
+        if info is None:  # 延遲載入的佔位節點
+            return
     
         # 更新姓名輸入框
-        if path:
-            self.name_entry.delete(0, tk.END)
-            self.name_entry.insert(0, path[0])  # 第一個元素是人名
+        self.name_entry.delete(0, tk.END)
+        self.name_entry.insert(0, info.person_name)
 
         # 根據選擇的節點類型執行不同操作
-        if len(path) == 3:  # [人名, 分類, 技能名稱] - 選中技能名稱
+        if info.kind == 'skill':  # [人名, 分類, 技能名稱] - 選中技能名稱
             # 啟用新增年度資料按鈕
             self.add_year_button['state'] = 'normal'
             # 更新技能分類和名稱
-            self.category_combobox.set(path[1])
+            self.category_combobox.set(info.category)
             self.on_category_selected(None)
-            self.skill_combobox.set(path[2])
-        elif len(path) == 4:  # [人名, 分類, 技能名稱, 年份]
+            self.skill_combobox.set(info.skill_name)
+        elif info.kind == 'year':  # [人名, 分類, 技能名稱, 年份]
             # 停用新增年度資料按鈕
             self.add_year_button['state'] = 'disabled'
 
             # 更新技能分類
-            self.category_combobox.set(path[1])
+            self.category_combobox.set(info.category)
         
             # 觸發分類選擇事件以更新技能名稱下拉選單
             self.on_category_selected(None)
         
             # 更新技能名稱
-            self.skill_combobox.set(path[2])
+            self.skill_combobox.set(info.skill_name)
         
             # 更新年份
             self.year_entry.delete(0, tk.END)
-            self.year_entry.insert(0, path[3])
+            self.year_entry.insert(0, info.year_period)
         
-            # 從資料庫獲取該技能的等級和經驗
+            # 從資料庫獲取該技能的等級和經驗 (匯入中無法讀取，只更新上面的欄位)
+            if self.database_busy(notify=False):
+                return
             try:
-                cursor = self.conn.cursor()
-                cursor.execute("""
-                    SELECT skill_level, experience
-                    FROM skills
-                    JOIN persons ON skills.person_id = persons.id
-                    WHERE persons.name = ?
-                    AND skill_category = ?
-                    AND skill_name = ?
-                    AND year_period = ?
-                """, (path[0], path[1], path[2], path[3]))
-            
-                result = cursor.fetchone()
+                result = self.repo.get_skill(info.row_id)
                 if result:
                     level, experience = result
                     # 更新技能等級
@@ -609,25 +1152,13 @@ class SkillTreeManager:
             messagebox.showerror("錯誤", "請先選擇技能")
             return
 
-        # 取得選中項目的路徑資訊
-        path = []
-        current = selected[0]
-        while current:
-            path.insert(0, self.tree.item(current)['text'])
-            current = self.tree.parent(current)
-
-        if len(path) != 3:
-            messagebox.showerror("錯誤", "請先選擇技能名稱")
-            return
-
-        person_name, category, skill_name = path
-    
         # 直接使用選中的節點作為 skill_id
         skill_id = selected[0]
+        info = self.node_info.get(skill_id)
 
-        #person_name = path[0]
-        #category = path[1]
-        #skill_name = path[2]
+        if info is None or info.kind != 'skill':
+            messagebox.showerror("錯誤", "請先選擇技能名稱")
+            return
     
         year_period = self.year_entry.get().strip()
         skill_level = self.level_spinbox.get()
@@ -636,67 +1167,26 @@ class SkillTreeManager:
         if not year_period:
             messagebox.showerror("錯誤", "請輸入年度期間")
             return
+        if self.database_busy():
+            return
 
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT 1 FROM skills s
-            JOIN persons p ON s.person_id = p.id
-            WHERE p.name = ? AND s.skill_category = ? 
-            AND s.skill_name = ? AND s.year_period = ?
-        """, (person_name, category, skill_name, year_period))
-
-        if cursor.fetchone():
+        try:
+            exists = self.repo.skill_exists(info.person_id, info.category, info.skill_name, year_period)
+        except sqlite3.OperationalError as e:
+            messagebox.showerror("錯誤", f"新增年度資料失敗: {str(e)}")
+            return
+        if exists:
             messagebox.showerror("錯誤", f"已存在 {year_period} 的技能資料")
             return
 
         try:
-            cursor.execute("SELECT id FROM persons WHERE name = ?", (person_name,))
-            person_id = cursor.fetchone()[0]
-
-            cursor.execute("""
-                INSERT INTO skills (person_id, skill_category, skill_name, year_period, skill_level, experience)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (person_id, category, skill_name, year_period, skill_level, experience))
-
-            self.conn.commit()
-
-            # 插入年度節點時進行排序
-            skill_id = selected[0]
-            # 修改 year_id 的生成方式
-            year_id = f"{person_name}_{category}_{skill_name}_{year_period}"
-        
-            skill_node = skill_id
-            year_position = 'end'
-
-            # 取得所有現有的年度節點
-            existing_years = []
-            for child in self.tree.get_children(skill_id):
-                year_text = self.tree.item(child)['text']
-                print(f"Child: {child}, Text: {year_text}")
-                existing_years.append((year_text, child))
-        
-            # 將新年度加入並排序
-            existing_years.append((year_period, None))
-            sorted_years = self.sort_years(existing_years)
-
-            # 找到新年度應該插入的位置
-            insert_pos = 0
-            for i, (year, _) in enumerate(sorted_years):
-                if year == year_period:
-                    insert_pos = i
-                    break
-        
-            # 如果不是要插在最後，則找到要插入位置的前一個節點
-            if insert_pos < len(sorted_years) - 1:
-                year_position = sorted_years[insert_pos + 1][1]
-            else:
-                year_position = 'end'
+            row_id = self.journal.add_skill(info.person_id, info.category, info.skill_name,
+                                            year_period, skill_level, experience)
 
-            # 插入新年度節點
-            year_node = self.tree.insert(skill_id, insert_pos, year_id, text=year_period)
-            self.tree.insert(year_node, 'end', f"{year_id}_level", text=f"技能等級: {skill_level}")
-            if experience:
-                self.tree.insert(year_node, 'end', f"{year_id}_exp", text=f"技能經驗: {experience}")
+            # 依年份順序插入年度節點；延遲載入模式下尚未展開的技能節點會在展開時載入
+            if not self.has_placeholder(skill_id):
+                self.insert_year_node(skill_id, year_period, period_sort_key(year_period),
+                                      skill_level, experience, row_id)
 
             messagebox.showinfo("成功", f"已新增 {year_period} 的技能資料")
 
@@ -707,21 +1197,30 @@ class SkillTreeManager:
             self.experience_text.delete("1.0", tk.END)
 
         except Exception as e:
-            self.conn.rollback()
             messagebox.showerror("錯誤", f"新增年度資料失敗: {str(e)}")
 
-    def sort_years(self, years):
-        """排序年度資料，考慮年度和半年度格式"""
-        def year_key(year_tuple):
-            year = year_tuple[0]
-            if 'H1' in year:
-                return year.replace('H1', '') + '1'
-            elif 'H2' in year:
-                return year.replace('H2', '') + '2'
-            return year
-    
-        return sorted(years, key=year_key)
-
+    def poll_skill_types(self):
+        """定期檢查 skill_type.json，有變更時重新匯入並更新下拉選單 (背景工作執行中時延後)"""
+        if not self.pending_tasks and self.catalog.changed():
+            # 匯入會 commit，先提交累積的編輯
+            self.journal.flush()
+            try:
+                if self.catalog.sync():
+                    self.apply_skill_types()
+            except (OSError, ValueError) as e:
+                print(f"[技能類型] 讀取 skill_type.json 失敗，沿用目前的定義: {e}")
+        self.root.after(CATALOG_POLL_INTERVAL, self.poll_skill_types)
+
+    def apply_skill_types(self):
+        """以目錄的最新內容更新分類與技能名稱下拉選單，不變動已輸入的文字"""
+        self.skill_types = self.catalog.types
+        categories = list(self.skill_types)
+        for category_combobox, skill_combobox in (
+                (self.category_combobox, self.skill_combobox),
+                (self.search_category_combobox, self.search_skill_combobox)):
+            category_combobox['values'] = categories
+            skill_combobox['values'] = self.catalog.skills(category_combobox.get())
+        self.status_label['text'] = "技能類型已更新"
 
     def on_category_selected(self, event):
         category = self.category_combobox.get()
@@ -736,15 +1235,17 @@ class SkillTreeManager:
         if not name:
             messagebox.showerror("錯誤", "請輸入姓名")
             return
+        if self.database_busy():
+            return
             
-        cursor = self.conn.cursor()
         try:
-            cursor.execute("INSERT INTO persons (name) VALUES (?)", (name,))
-            self.conn.commit()
-            self.tree.insert('', 'end', name, text=name)
+            person_id = self.journal.add_person(name)
+            self.insert_person_node(name, person_id)
             messagebox.showinfo("成功", f"已新增人員: {name}")
         except sqlite3.IntegrityError:
             messagebox.showerror("錯誤", "此姓名已存在")
+        except sqlite3.OperationalError as e:
+            messagebox.showerror("錯誤", f"新增人員失敗: {str(e)}")
             
 
     def add_skill(self):
@@ -763,140 +1264,183 @@ class SkillTreeManager:
             messagebox.showerror("錯誤", "請填寫必要的技能資訊（技能分類、名稱、年份和等級）")
             return
             
-        person_name = self.tree.item(selected[0])['text']
-        cursor = self.conn.cursor()
-    
-        # 取得person_id
-        cursor.execute("SELECT id FROM persons WHERE name=?", (person_name,))
-        person_id = cursor.fetchone()[0]
+        info = self.node_info.get(selected[0])
+        if info is None:
+            messagebox.showerror("錯誤", "請先選擇人員")
+            return
+        person_name = info.person_name
+        person_id = info.person_id
+        if self.database_busy():
+            return
     
         # 新增技能資料
-        cursor.execute("""
-            INSERT INTO skills (person_id, skill_category, skill_name, year_period, skill_level, experience)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (person_id, category, skill_name, year_period, skill_level, experience))
-    
-        self.conn.commit()
+        try:
+            row_id = self.journal.add_skill(person_id, category, skill_name, year_period,
+                                            skill_level, experience)
+        except sqlite3.IntegrityError:
+            messagebox.showerror("錯誤", f"已存在 {year_period} 的技能資料")
+            return
+        except sqlite3.OperationalError as e:
+            messagebox.showerror("錯誤", f"新增技能失敗: {str(e)}")
+            return
     
         # 更新樹狀圖
         category_id = f"{person_name}_{category}"
         skill_id = f"{category_id}_{skill_name}"
-        year_id = f"{skill_id}_{year_period}"
+
+        # 延遲載入模式下，尚未展開的節點會在展開時從資料庫載入新資料
+        if any(self.has_placeholder(node) for node in (person_name, category_id, skill_id)):
+            messagebox.showinfo("成功", "技能已新增")
+            return
     
         if not self.tree.exists(category_id):
-            self.tree.insert(person_name, 'end', category_id, text=category)
+            self.insert_category_node(person_name, category)
         if not self.tree.exists(skill_id):
-            self.tree.insert(category_id, 'end', skill_id, text=skill_name)
-
-        # 插入年度節點時進行排序
-        skill_node = skill_id
-        year_position = 'end'
-    
-        # 取得所有現有的年度節點
-        existing_years = []
-        for child in self.tree.get_children(skill_node):
-            year_text = self.tree.item(child)['text']
-            existing_years.append((year_text, child))
-    
-        # 將新年度加入並排序
-        existing_years.append((year_period, None))
-        sorted_years = self.sort_years(existing_years)
-    
-        # 找到新年度應該插入的位置
-        insert_pos = 0
-        for i, (year, _) in enumerate(sorted_years):
-            if year == year_period:
-                insert_pos = i
-                break
-    
-        # 如果不是要插在最後，則找到要插入位置的前一個節點
-        if insert_pos < len(sorted_years) - 1:
-            year_position = sorted_years[insert_pos + 1][1]
-    
-        # 插入新年度節點
+            self.insert_skill_node(category_id, skill_name)
 
-        print(f"skill_id: {skill_node}")
-        print(f"year_position: {year_position}")
-        print(f"year_id: {year_id}")
-
-        year_node = self.tree.insert(skill_node, year_position, year_id, text=year_period)
-        self.tree.insert(year_node, 'end', f"{year_id}_level", text=f"技能等級: {skill_level}")
-        if experience:
-            self.tree.insert(year_node, 'end', f"{year_id}_exp", text=f"技能經驗: {experience}")
+        # 依年份順序插入年度節點
+        self.insert_year_node(skill_id, year_period, period_sort_key(year_period),
+                              skill_level, experience, row_id)
             
         messagebox.showinfo("成功", "技能已新增")
 
     def save_data(self):
-        self.conn.commit()
+        if self.database_busy():
+            return
+        try:
+            self.journal.flush()
+        except sqlite3.OperationalError as e:
+            messagebox.showerror("錯誤", f"儲存失敗: {str(e)}")
+            return
         messagebox.showinfo("成功", "資料已儲存")
+
+    def autosave(self):
+        """定期提交累積的編輯；背景工作執行中時延後，commit 不必等待背景連線的鎖"""
+        if not self.pending_tasks:
+            try:
+                self.journal.flush()
+            except sqlite3.OperationalError as e:
+                print(f"[儲存] 自動儲存失敗，稍後重試: {e}")
+        self.root.after(JOURNAL_COMMIT_INTERVAL, self.autosave)
+
+    def undo(self):
+        self.replay_journal(self.journal.undo, "復原")
+
+    def redo(self):
+        self.replay_journal(self.journal.redo, "重做")
+
+    def replay_journal(self, action, verb):
+        """執行復原或重做，並更新受影響人員的樹狀節點"""
+        if self.database_busy():
+            return
+        try:
+            result = action()
+        except sqlite3.Error as e:
+            messagebox.showerror("錯誤", f"{verb}失敗: {str(e)}")
+            return
+        if result is None:
+            self.status_label['text'] = f"沒有可{verb}的操作"
+            return
+        label, changes = result
+        self.apply_journal_changes(changes)
+        self.status_label['text'] = f"已{verb}: {label}"
+
+    def apply_journal_changes(self, changes):
+        """依復原/重做套用的修改新增或移除人員節點，其餘人員以 refresh_person_nodes 比對更新"""
+        person_names = {person_id: name for name, person_id in self.person_ids.items()}
+        refresh_ids = {}
+        for table, before, after in changes:
+            if table == 'persons':
+                if after is None:
+                    person_id, person_name = before
+                    person_names.pop(person_id, None)
+                    refresh_ids.pop(person_id, None)
+                    self.person_ids.pop(person_name, None)
+                    if self.tree.exists(person_name):
+                        self.delete_tree_node(person_name)
+                else:
+                    person_id, person_name = after
+                    person_names[person_id] = person_name
+                    self.person_ids[person_name] = person_id
+                    refresh_ids[person_id] = None
+            else:
+                refresh_ids[(after or before)[1]] = None
+        self.refresh_person_nodes([person_names[person_id] for person_id in refresh_ids
+                                   if person_id in person_names])
+
+    def on_close(self):
+        """關閉視窗前提交尚未儲存的編輯"""
+        try:
+            self.journal.flush()
+        except sqlite3.OperationalError as e:
+            if not messagebox.askyesno("確認關閉", f"尚未儲存的編輯無法儲存: {str(e)}\n仍要關閉嗎？"):
+                return
+        self.root.destroy()
         
     def export_mm(self):
+        """將選取的人員匯出為 FreeMind (.mm) 檔"""
         selected = self.tree.selection()
         if not selected:
             messagebox.showerror("錯誤", "請選擇要匯出的人員")
             return
             
-        person_name = self.tree.item(selected[0])['text']
-        
-        # 建立FreeMind XML結構，設定正確的編碼
-        root = ET.Element("map")
-        root.set("version", "1.0.1")
-        
-        # 加入 XML 宣告
-        declaration = '<?xml version="1.0" encoding="UTF-8" standalone="no"?>'
-        
-        # 設定主節點
-        main_node = ET.SubElement(root, "node")
-        main_node.set("TEXT", person_name)  # 使用 TEXT 屬性而不是 text
-        
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT skill_category, skill_name, year_period, skill_level, experience
-            FROM skills
-            JOIN persons ON skills.person_id = persons.id
-            WHERE persons.name = ?
-            ORDER BY skill_category, skill_name, year_period
-        """, (person_name,))
-        
-        skills = cursor.fetchall()
-        
-        # 建立技能樹結構
-        categories = {}
-        for skill in skills:
-            category, name, year, level, exp = skill
-            
-            if category not in categories:
-                cat_node = ET.SubElement(main_node, "node")
-                cat_node.set("TEXT", category)  # 使用 TEXT 屬性
-                categories[category] = cat_node
-            
-            skill_node = ET.SubElement(categories[category], "node")
-            skill_node.set("TEXT", name)  # 使用 TEXT 屬性
-            
-            year_node = ET.SubElement(skill_node, "node")
-            year_node.set("TEXT", year)  # 使用 TEXT 屬性
-            
-            level_node = ET.SubElement(year_node, "node")
-            level_node.set("TEXT", f"技能等級: {level}")  # 使用 TEXT 屬性
-            
-            if exp:  # 只在有經驗描述時才添加節點
-                exp_node = ET.SubElement(year_node, "node")
-                exp_node.set("TEXT", f"技能經驗: {exp}")  # 使用 TEXT 屬性
-        
-        # 將 XML 轉換為字串，確保正確的編碼
-        xml_str = ET.tostring(root, encoding='unicode')
-        
-        # 組合完整的 XML 文件
-        full_xml = f"{declaration}\n{xml_str}"
-        
-        # 使用 UTF-8 編碼寫入檔案
-        with open(f"{person_name}_skills.mm", 'w', encoding='utf-8') as f:
-            f.write(full_xml)
+        info = self.node_info.get(selected[0])
+        if info is None:
+            messagebox.showerror("錯誤", "請選擇要匯出的人員")
+            return
+        person_name = info.person_name
+        person_id = self.person_ids[person_name]
+        file_path = f"{person_name}_skills.mm"
+
+        self.run_in_background(
+            "匯出中...",
+            lambda conn, progress: export_mm_file(conn, file_path, person_id, progress),
+            lambda result: messagebox.showinfo("成功", f"已匯出到 {file_path}"),
+            "匯出失敗")
+
+    def export_mm_batch(self):
+        """每位人員各匯出一個 FreeMind (.mm) 檔到選擇的資料夾"""
+        directory = filedialog.askdirectory(title="選擇匯出資料夾")
+        if not directory:
+            return
+
+        db_path = self.db_worker.db_path
+
+        def on_exported(result):
+            file_count, skill_count, elapsed = result
+            messagebox.showinfo(
+                "成功", f"已匯出 {file_count} 個檔案 ({skill_count} 筆技能資料) 到 {directory}\n"
+                        f"耗時 {elapsed:.1f} 秒，每秒 {file_count / elapsed if elapsed else 0:.0f} 個檔案")
 
-        messagebox.showinfo("成功", f"已匯出到 {person_name}_skills.mm")
+        self.run_in_background(
+            "匯出中...",
+            lambda conn, progress: export_mm_directory(db_path, directory, progress=progress),
+            on_exported,
+            "匯出失敗")
+
+    def export_mm_all(self):
+        """將所有人員匯出為同一個 FreeMind (.mm) 檔"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".mm",
+            initialfile="skills.mm",
+            filetypes=[("FreeMind files", "*.mm"), ("All files", "*.*")],
+            title="儲存技能樹"
+        )
+
+        if file_path:
+            self.run_in_background(
+                "匯出中...",
+                lambda conn, progress: export_mm_file(conn, file_path, progress=progress),
+                lambda result: messagebox.showinfo(
+                    "成功", f"已匯出 {result[0]} 位人員, {result[1]} 筆技能資料到 {file_path}"),
+                "匯出失敗")
 
     def __del__(self):
-        self.conn.close()
+        # 建構時失敗 (例如資料庫有重複技能而無法升級) 的物件可能還沒有背景執行緒或連線
+        if hasattr(self, 'db_worker'):
+            self.db_worker.stop()
+        if hasattr(self, 'repo'):
+            self.repo.close()
 
 #===========================================
 #  
@@ -925,28 +1469,71 @@ class SkillTreeManager:
         year_frame.pack(fill=tk.X, padx=5, pady=5)
         
         ttk.Label(year_frame, text="年份期間:").pack(side=tk.LEFT, padx=5)
-        self.search_year_entry = ttk.Entry(year_frame)
+        self.search_year_entry = ttk.Entry(year_frame, width=10)
         self.search_year_entry.pack(side=tk.LEFT, padx=5)
-        
+        ttk.Label(year_frame, text="至").pack(side=tk.LEFT)
+        self.search_year_to_entry = ttk.Entry(year_frame, width=10)
+        self.search_year_to_entry.pack(side=tk.LEFT, padx=5)
+
+        # 技能等級範圍
+        ttk.Label(year_frame, text="技能等級:").pack(side=tk.LEFT, padx=5)
+        self.search_min_level_spinbox = ttk.Spinbox(year_frame, from_=0, to=5, width=4)
+        self.search_min_level_spinbox.pack(side=tk.LEFT, padx=5)
+        ttk.Label(year_frame, text="至").pack(side=tk.LEFT)
+        self.search_max_level_spinbox = ttk.Spinbox(year_frame, from_=0, to=5, width=4)
+        self.search_max_level_spinbox.pack(side=tk.LEFT, padx=5)
+
+        # 統計分組欄位
+        group_frame = ttk.Frame(search_criteria_frame)
+        group_frame.pack(fill=tk.X, padx=5, pady=5)
+
+        ttk.Label(group_frame, text="統計分組:").pack(side=tk.LEFT, padx=5)
+        self.aggregate_group_vars = {}
+        for name, (label, _) in AGGREGATE_GROUPS.items():
+            var = tk.BooleanVar(value=True)
+            ttk.Checkbutton(group_frame, text=label, variable=var).pack(side=tk.LEFT, padx=5)
+            self.aggregate_group_vars[name] = var
+
         # 查詢按鈕
-        ttk.Button(search_criteria_frame, text="查詢", command=self.perform_search).pack(pady=10)
+        button_frame = ttk.Frame(search_criteria_frame)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="查詢", command=self.perform_search).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="統計", command=self.perform_aggregate).pack(side=tk.LEFT, padx=5)
+
+        # 全文搜尋：輸入時即時搜尋技能經驗
+        fulltext_frame = ttk.LabelFrame(parent, text="技能經驗全文搜尋")
+        fulltext_frame.pack(fill=tk.X, padx=5, pady=5)
+
+        ttk.Label(fulltext_frame, text="關鍵字:").pack(side=tk.LEFT, padx=5)
+        self.fulltext_entry = ttk.Entry(fulltext_frame)
+        self.fulltext_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5, pady=5)
+        self.fulltext_entry.bind('<KeyRelease>', self.on_fulltext_key)
+        # 關鍵字太短無法使用索引時，按 Enter 才逐筆比對
+        self.fulltext_entry.bind('<Return>', lambda event: self.perform_fulltext_search(scan=True))
+        self.fulltext_after_id = None
+        # 每次搜尋遞增，背景搜尋完成時用來判斷結果是否已過時
+        self.fulltext_generation = 0
 
         # 查詢結果顯示區域
         result_frame = ttk.LabelFrame(parent, text="查詢結果")
         result_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
     
         # 建立結果顯示的表格，設定較高的 row height
-        columns = ('name', 'skill_level', 'experience')
+        columns = ('name', 'skill', 'year_period', 'skill_level', 'experience')
         self.result_tree = ttk.Treeview(result_frame, columns=columns, show='headings', 
                                    height=10)  # 限制顯示行數，避免過度展開
     
         # 設定欄位標題和寬度
         self.result_tree.heading('name', text='人員姓名')
+        self.result_tree.heading('skill', text='技能')
+        self.result_tree.heading('year_period', text='年份期間')
         self.result_tree.heading('skill_level', text='技能等級')
         self.result_tree.heading('experience', text='技能經驗')
     
         # 調整欄位寬度
         self.result_tree.column('name', width=100, stretch=False)
+        self.result_tree.column('skill', width=140, stretch=False)
+        self.result_tree.column('year_period', width=70, stretch=False)
         self.result_tree.column('skill_level', width=60, stretch=False)
         self.result_tree.column('experience', width=600, stretch=True)  # 技能經驗欄位可伸縮
     
@@ -964,10 +1551,47 @@ class SkillTreeManager:
         vsb.grid(row=0, column=1, sticky='ns')
         hsb.grid(row=1, column=0, sticky='ew')
     
+        # 分頁切換
+        page_frame = ttk.Frame(result_frame)
+        page_frame.grid(row=2, column=0, columnspan=2, sticky='ew')
+        self.prev_page_button = ttk.Button(page_frame, text="上一頁", state='disabled',
+                                           command=lambda: self.show_search_page(self.search_page - 1))
+        self.prev_page_button.pack(side=tk.LEFT, padx=5, pady=2)
+        self.next_page_button = ttk.Button(page_frame, text="下一頁", state='disabled',
+                                           command=lambda: self.show_search_page(self.search_page + 1))
+        self.next_page_button.pack(side=tk.LEFT, padx=5, pady=2)
+        self.page_label = ttk.Label(page_frame, text="")
+        self.page_label.pack(side=tk.LEFT, padx=5)
+
+        # 目前查詢的條件、總筆數與頁碼，翻頁時只重新查詢該頁
+        self.search_criteria = None
+        self.search_total = 0
+        self.search_page = 0
+    
         # 配置grid權重，使表格可以跟隨視窗調整大小
         result_frame.grid_rowconfigure(0, weight=1)
         result_frame.grid_columnconfigure(0, weight=1)
 
+        # 統計結果顯示區域
+        stats_frame = ttk.LabelFrame(parent, text="統計結果")
+        stats_frame.pack(fill=tk.X, padx=5, pady=5)
+
+        columns = ('group', 'persons', 'avg_level', 'max_level')
+        self.stats_tree = ttk.Treeview(stats_frame, columns=columns, show='headings', height=6)
+        self.stats_tree.heading('group', text='分組')
+        self.stats_tree.heading('persons', text='人數')
+        self.stats_tree.heading('avg_level', text='平均等級')
+        self.stats_tree.heading('max_level', text='最高等級')
+        self.stats_tree.column('group', width=300, stretch=True)
+        self.stats_tree.column('persons', width=60, stretch=False)
+        self.stats_tree.column('avg_level', width=80, stretch=False)
+        self.stats_tree.column('max_level', width=80, stretch=False)
+
+        stats_vsb = ttk.Scrollbar(stats_frame, orient="vertical", command=self.stats_tree.yview)
+        self.stats_tree.configure(yscrollcommand=stats_vsb.set)
+        self.stats_tree.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        stats_vsb.pack(side=tk.RIGHT, fill=tk.Y)
+
     def on_search_category_selected(self, event):
         """當查詢分頁中選擇技能分類時更新技能名稱選項"""
         category = self.search_category_combobox.get()
@@ -976,68 +1600,193 @@ class SkillTreeManager:
             if self.skill_types[category]:
                 self.search_skill_combobox.set(self.skill_types[category][0])
 
+    def get_search_criteria(self):
+        """讀取查詢分頁的條件，格式錯誤時顯示錯誤並回傳 None
+
+        年份只填起始時視為單一年份；等級為空白表示不限
+        """
+        period_from = self.search_year_entry.get().strip()
+        period_to = self.search_year_to_entry.get().strip() or period_from
+
+        levels = []
+        for spinbox in (self.search_min_level_spinbox, self.search_max_level_spinbox):
+            text = spinbox.get().strip()
+            if not text:
+                levels.append(None)
+                continue
+            try:
+                levels.append(int(text))
+            except ValueError:
+                messagebox.showerror("錯誤", f"技能等級必須是數字: {text}")
+                return None
+
+        criteria = {
+            'category': self.search_category_combobox.get().strip(),
+            'skill_name': self.search_skill_combobox.get().strip(),
+            'period_from': period_from,
+            'period_to': period_to,
+            'min_level': levels[0],
+            'max_level': levels[1],
+        }
+        try:
+            period_range_bounds(period_from, period_to)
+        except ValueError as e:
+            messagebox.showerror("錯誤", str(e))
+            return None
+        return criteria
+
     def perform_search(self):
-        """執行查詢"""
+        """執行查詢，先以 COUNT 取得總筆數，結果分頁顯示"""
         # 清空現有結果
         for item in self.result_tree.get_children():
             self.result_tree.delete(item)
             
         # 獲取查詢條件
-        skill_category = self.search_category_combobox.get()
-        skill_name = self.search_skill_combobox.get()
-        year_period = self.search_year_entry.get()
-        
-        # 驗證輸入
-        if not all([skill_category, skill_name, year_period]):
-            messagebox.showerror("錯誤", "請填寫所有查詢條件")
+        criteria = self.get_search_criteria()
+        if criteria is None:
             return
             
-        try:
-            cursor = self.conn.cursor()
-            # 執行查詢
-            cursor.execute("""
-                SELECT DISTINCT p.name, s.skill_level, s.experience
-                FROM persons p
-                JOIN skills s ON p.id = s.person_id
-                WHERE s.skill_category = ? 
-                AND s.skill_name = ?
-                AND s.year_period = ?
-                ORDER BY p.name
-            """, (skill_category, skill_name, year_period))
-            
-            results = cursor.fetchall()
-            
-            if not results:
+        def query(conn, progress):
+            # 執行查詢：總筆數與第一頁
+            repo = SkillRepository(conn)
+            total = repo.count(**criteria)
+            rows = repo.search(limit=SEARCH_PAGE_SIZE, **criteria) if total else []
+            return total, rows
+
+        def show_results(result):
+            total, rows = result
+            self.search_criteria = criteria
+            self.search_total = total
+            if not total:
+                self.show_page_rows(0, [])
                 messagebox.showinfo("查詢結果", "沒有找到符合條件的資料")
                 return
-                
-            # 顯示結果
-            #for name, level, experience in results:
-            #    self.result_tree.insert('', 'end', values=(name, level, experience or ""))
-            # 顯示結果，對技能經驗進行處理
-            #for name, level, experience in results:
-            #    # 如果經驗內容過長，截斷並添加省略號
-            #    display_exp = experience if experience else ""
-            #    if len(display_exp) > 50:  # 設定顯示長度閾值
-            #        display_exp = display_exp[:47] + "..."
-            #    
-            #    self.result_tree.insert('', 'end', values=(name, level, display_exp))
-
-            # 顯示結果，處理多行文字
-            for name, level, experience in results:
-                # 格式化經驗文字：每30個字元換行
-                if experience:
-                    formatted_exp = self.format_experience_text(experience)
-                else:
-                    formatted_exp = ""
-                
-                # 插入資料
-                self.result_tree.insert('', 'end', values=(name, level, formatted_exp))
+            self.show_page_rows(0, rows)
 
+        self.run_in_background("查詢中...", query, show_results, "查詢失敗")
 
-        except Exception as e:
-            messagebox.showerror("錯誤", f"查詢失敗: {str(e)}")
+    def show_search_page(self, page):
+        """切換到查詢結果的指定頁，只查詢該頁的資料"""
+        if self.search_criteria is None:
+            return
+        page_count = max(1, -(-self.search_total // SEARCH_PAGE_SIZE))
+        page = min(max(page, 0), page_count - 1)
+        criteria = self.search_criteria
+
+        def query(conn, progress):
+            return SkillRepository(conn).search(limit=SEARCH_PAGE_SIZE,
+                                                offset=page * SEARCH_PAGE_SIZE, **criteria)
+
+        # 第一頁查詢時已提交編輯，換頁不再 commit
+        self.run_in_background("查詢中...", query, lambda rows: self.show_page_rows(page, rows),
+                               "查詢失敗", flush=False)
+
+    def show_page_rows(self, page, rows):
+        """顯示一頁查詢結果並更新分頁按鈕，只格式化這一頁的經驗文字"""
+        self.result_tree.delete(*self.result_tree.get_children())
+        self.search_page = page
+
+        # 顯示結果，處理多行文字
+        for name, skill_category, skill_name, year_period, level, experience in rows:
+            # 格式化經驗文字：每30個字元換行
+            if experience:
+                formatted_exp = self.format_experience_text(experience)
+            else:
+                formatted_exp = ""
+
+            # 插入資料
+            self.result_tree.insert('', 'end', values=(
+                name, f"{skill_category}/{skill_name}", year_period, level, formatted_exp))
+
+        page_count = max(1, -(-self.search_total // SEARCH_PAGE_SIZE))
+        self.page_label.config(text=f"第 {page + 1}/{page_count} 頁，共 {self.search_total} 筆")
+        self.prev_page_button.config(state='normal' if page > 0 else 'disabled')
+        self.next_page_button.config(state='normal' if page + 1 < page_count else 'disabled')
+
+    def perform_aggregate(self):
+        """依查詢條件統計各分組的人數、平均與最高等級"""
+        self.stats_tree.delete(*self.stats_tree.get_children())
+
+        criteria = self.get_search_criteria()
+        if criteria is None:
+            return
+        group_by = [name for name, var in self.aggregate_group_vars.items() if var.get()]
+        if not group_by:
+            messagebox.showerror("錯誤", "請至少選擇一個統計分組")
+            return
 
+        def query(conn, progress):
+            return SkillRepository(conn).aggregate(group_by, **criteria)
+
+        def show_results(results):
+            if not results:
+                messagebox.showinfo("統計結果", "沒有找到符合條件的資料")
+                return
+
+            for row in results:
+                groups = row[:len(group_by)]
+                persons, avg_level, max_level = row[len(group_by):]
+                self.stats_tree.insert('', 'end', values=(
+                    " / ".join(str(value) for value in groups), persons, avg_level, max_level))
+
+        self.run_in_background("統計中...", query, show_results, "統計失敗")
+
+    def on_fulltext_key(self, event):
+        """輸入全文搜尋關鍵字時，停止輸入一小段時間後才執行搜尋"""
+        if event.keysym == 'Return':  # 已由 <Return> 立即搜尋
+            return
+        if self.fulltext_after_id:
+            self.root.after_cancel(self.fulltext_after_id)
+        self.fulltext_after_id = self.root.after(FTS_SEARCH_DELAY, self.perform_fulltext_search)
+
+    def perform_fulltext_search(self, scan=False):
+        """在背景執行緒以全文索引搜尋技能經驗，顯示依相關程度排序的結果與摘要
+
+        輸入期間可能排入多次搜尋，只顯示最後一次的結果，較舊的搜尋不執行或直接捨棄。
+        關鍵字都太短時需逐筆比對整個表，只在 scan 為 True (按 Enter) 時執行
+        """
+        if self.fulltext_after_id:
+            self.root.after_cancel(self.fulltext_after_id)
+        self.fulltext_after_id = None
+        self.fulltext_generation += 1
+        generation = self.fulltext_generation
+
+        # 全文搜尋結果已限制筆數，不分頁
+        self.search_criteria = None
+        self.prev_page_button.config(state='disabled')
+        self.next_page_button.config(state='disabled')
+
+        text = self.fulltext_entry.get().strip()
+        if not text:
+            self.result_tree.delete(*self.result_tree.get_children())
+            self.page_label.config(text="")
+            return
+        # trigram 索引無法搜尋太短的關鍵字，輸入時不查詢也不清除目前的結果
+        unranked = max(len(term) for term in text.split()) < FTS_MIN_TERM_LENGTH
+        if unranked and not scan:
+            self.page_label.config(
+                text=f"關鍵字少於 {FTS_MIN_TERM_LENGTH} 個字，按 Enter 逐筆搜尋")
+            return
+
+        def query(conn, progress):
+            if generation != self.fulltext_generation:
+                return None
+            return SkillRepository(conn).search_experience(text)
+
+        def show_results(results):
+            if results is None or generation != self.fulltext_generation:
+                return
+            self.result_tree.delete(*self.result_tree.get_children())
+            for name, category, skill_name, year_period, level, snippet in results:
+                self.result_tree.insert('', 'end', values=(
+                    name, f"{category}/{skill_name}", year_period, level,
+                    self.format_experience_text(snippet)))
+            order = "由新到舊，未依相關程度排序" if unranked else "依相關程度排序"
+            self.page_label.config(
+                text=f"全文搜尋 {len(results)} 筆 (最多 {FTS_RESULT_LIMIT} 筆，{order})")
+
+        # 每次輸入都可能搜尋，不為此 commit；尚未儲存的編輯在下次自動儲存後才搜尋得到
+        self.run_in_background("搜尋中...", query, show_results, "查詢失敗", flush=False)
 
     # 新增格式化經驗文字的方法
     def format_experience_text(self, text):
@@ -1062,8 +1811,25 @@ class SkillTreeManager:
         return '\n'.join(formatted_paragraphs)
 
 if __name__ == "__main__":
+    # 資料庫在本機磁碟時，可用 --db-profile=wal (或 SKILLS_DB_PROFILE=wal) 改用 WAL 設定；
+    # 比較各設定的延遲請執行 python skill_db.py benchmark-profiles
+    db_profile = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--db-profile='):
+            db_profile = arg.split('=', 1)[1]
+
+    # SKILLS_PROFILE=1|cprofile 或 --profile[=cprofile] 啟用效能記錄，結束時輸出摘要
+    profiler = StartupProfiler.from_environment(sys.argv[1:])
+
     root = tk.Tk()
-    app = SkillTreeManager(root)
+    try:
+        app = SkillTreeManager(root, lazy_load='--lazy' in sys.argv, db_profile=db_profile,
+                               profiler=profiler)
+    except DuplicateSkillsError as e:
+        # 舊資料庫有重複的技能資料，須由使用者確認後以命令列清除
+        messagebox.showerror("無法升級資料庫", str(e))
+        root.destroy()
+        sys.exit(1)
     root.mainloop()
 
 
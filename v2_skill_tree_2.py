@@ -6,6 +6,11 @@ from tkinter import filedialog
 import csv
 from datetime import datetime
 
+from skill_db import SkillHistoryRepository, SkillTypeCatalog, connect_database
+
+# 每隔多久 (毫秒) 檢查 skill_type.json 是否有變更
+CATALOG_POLL_INTERVAL = 2000
+
 class SkillTreeApp:
 
     def __init__(self, root):
@@ -13,121 +18,100 @@ class SkillTreeApp:
         self.root.title("技能樹管理系統")
         self.root.geometry("1200x800")
         
-        # 讀取技能類型
-        self.skill_types = self.load_skill_types()
-        
         # 建立資料庫連接
         self.init_database()
         
+        # 讀取技能類型
+        self.skill_types = self.load_skill_types()
+        
         # 建立主要框架
         self.create_main_frame()
         
         # 更新樹狀圖
         self.refresh_data()
+        self.root.after(CATALOG_POLL_INTERVAL, self.poll_skill_types)
 
     def load_skill_types(self):
-        try:
-            with open('skill_type.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
+        """技能類型存於資料庫的 skill_types 表，skill_type.json 有變更時才重新匯入"""
+        self.catalog = SkillTypeCatalog(self.conn, 'skill_type.json')
+        skill_types = self.catalog.load()
+        if not skill_types and self.catalog.file_stamp() is None:
             messagebox.showerror("錯誤", "找不到 skill_type.json 檔案")
-            return {}
+        return skill_types
+
+    def poll_skill_types(self):
+        """定期檢查 skill_type.json，有變更時更新技能分類與技能下拉選單"""
+        if self.catalog.changed():
+            try:
+                if self.catalog.sync():
+                    self.skill_types = self.catalog.types
+                    self.category_cb['values'] = list(self.skill_types)
+                    self.skill_cb['values'] = self.catalog.skills(self.category_cb.get())
+            except (OSError, ValueError) as e:
+                print(f"讀取 skill_type.json 失敗，沿用目前的定義: {e}")
+        self.root.after(CATALOG_POLL_INTERVAL, self.poll_skill_types)
 
     def init_database(self):
-        self.conn = sqlite3.connect('skills.db')
-        self.cursor = self.conn.cursor()
-        
-        # 檢查表格是否存在
-        self.cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='persons'
-        """)
+        # 所有 SQL 由 repository 執行，重複使用同一 cursor 與已編譯的敘述
+        self.repo = SkillHistoryRepository(connect_database(
+            'skills.db', foreign_keys=SkillHistoryRepository.FOREIGN_KEYS))
+        self.conn = self.repo.conn
         
         # 如果表格不存在，則創建
-        if not self.cursor.fetchone():
-            # 建立人員表格
-            self.cursor.execute('''
-                CREATE TABLE persons (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE
-                )
-            ''')
-            
-            # 建立技能表格
-            self.cursor.execute('''
-                CREATE TABLE skills (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    person_id INTEGER,
-                    category TEXT,
-                    name TEXT,
-                    experience TEXT,
-                    FOREIGN KEY (person_id) REFERENCES persons(id),
-                    UNIQUE(person_id, category, name)
-                )
-            ''')
-            
-            # 建立技能歷史記錄表格
-            self.cursor.execute('''
-                CREATE TABLE skill_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    skill_id INTEGER,
-                    year TEXT,
-                    level INTEGER,
-                    approve TEXT,
-                    FOREIGN KEY (skill_id) REFERENCES skills(id),
-                    UNIQUE(skill_id, year)
-                )
-            ''')
-            
-            self.conn.commit()
+        if self.repo.create_schema():
             print("資料庫表格已創建")
         else:
             print("資料庫表格已存在")
 
+    def iter_skill_tree(self):
+        """依人員分組讀取所有技能與歷史記錄 (單一查詢)
 
+        產生 (人員, [(分類, 技能, 經驗, [(年度, 等級, 核准者), ...]), ...])
+        """
+        current_person = None
+        current_skill_id = None
+        skills = []
+        for person, skill_id, category, skill_name, experience, year, level, approve in self.repo.skill_tree():
+            if person != current_person:
+                if current_person is not None:
+                    yield current_person, skills
+                current_person = person
+                current_skill_id = None
+                skills = []
+            if skill_id is None:  # 沒有技能的人員
+                continue
+            if skill_id != current_skill_id:
+                skills.append((category, skill_name, experience, []))
+                current_skill_id = skill_id
+            if year is not None:
+                skills[-1][3].append((year, level, approve))
+        if current_person is not None:
+            yield current_person, skills
 
     def refresh_data(self):
-        # 更新人員下拉選單
-        self.cursor.execute("SELECT name FROM persons")
-        persons = [row[0] for row in self.cursor.fetchall()]
-        self.person_cb['values'] = persons
-        
         # 清空並更新樹狀圖
         for item in self.tree.get_children():
             self.tree.delete(item)
             
         # 重新載入資料到樹狀圖
-        for person in persons:
+        persons = []
+        for person, skills in self.iter_skill_tree():
+            persons.append(person)
             person_id = self.tree.insert('', 'end', text=person)
             
-            # 查詢該人員的技能
-            self.cursor.execute('''
-                SELECT s.category, s.name, s.id, s.experience
-                FROM skills s
-                JOIN persons p ON s.person_id = p.id
-                WHERE p.name = ?
-            ''', (person,))
-            
-            skills = self.cursor.fetchall()
-            for category, skill_name, skill_id, experience in skills:
+            for category, skill_name, experience, histories in skills:
                 skill_node = self.tree.insert(person_id, 'end', 
                                             text=f"{category} - {skill_name}",
                                             values=(experience,))
                 
-                # 查詢技能歷史記錄
-                self.cursor.execute('''
-                    SELECT year, level, approve
-                    FROM skill_history
-                    WHERE skill_id = ?
-                    ORDER BY year
-                ''', (skill_id,))
-                
-                histories = self.cursor.fetchall()
                 for year, level, approve in histories:
                     self.tree.insert(skill_node, 'end', 
                                    text=f"{year} - Level {level}",
                                    values=(f"核准者: {approve if approve else 'N/A'}",))
 
+        # 更新人員下拉選單
+        self.person_cb['values'] = persons
+
     def create_main_frame(self):
         # 左側框架 - 樹狀圖
         left_frame = ttk.Frame(self.root)
@@ -218,40 +202,22 @@ class SkillTreeApp:
         for item in self.tree.get_children():
             self.tree.delete(item)
             
-        # 更新人員下拉選單
-        self.cursor.execute("SELECT name FROM persons")
-        persons = [row[0] for row in self.cursor.fetchall()]
-        self.person_cb['values'] = persons
-        
         # 更新樹狀圖
-        for person in persons:
+        persons = []
+        for person, skills in self.iter_skill_tree():
+            persons.append(person)
             person_id = self.tree.insert('', 'end', text=person)
             
-            # 查詢該人員的技能
-            self.cursor.execute('''
-                SELECT s.category, s.name, s.id
-                FROM skills s
-                JOIN persons p ON s.person_id = p.id
-                WHERE p.name = ?
-            ''', (person,))
-            
-            skills = self.cursor.fetchall()
-            for category, skill_name, skill_id in skills:
+            for category, skill_name, experience, histories in skills:
                 skill_node = self.tree.insert(person_id, 'end', text=f"{category} - {skill_name}")
                 
-                # 查詢技能歷史記錄
-                self.cursor.execute('''
-                    SELECT year, level, approve
-                    FROM skill_history
-                    WHERE skill_id = ?
-                    ORDER BY year
-                ''', (skill_id,))
-                
-                histories = self.cursor.fetchall()
                 for year, level, approve in histories:
                     self.tree.insert(skill_node, 'end', 
                                    text=f"{year} - Level {level} - Approved by: {approve if approve else 'N/A'}")
 
+        # 更新人員下拉選單
+        self.person_cb['values'] = persons
+
     def update_skills_cb(self, event=None):
         category = self.category_cb.get()
         if category in self.skill_types:
@@ -261,7 +227,7 @@ class SkillTreeApp:
         name = self.person_name.get().strip()
         if name:
             try:
-                self.cursor.execute("INSERT INTO persons (name) VALUES (?)", (name,))
+                self.repo.add_person(name)
                 self.conn.commit()
                 self.update_tree()
                 self.person_name.delete(0, tk.END)
@@ -292,16 +258,7 @@ class SkillTreeApp:
         
         try:
             # 更新經驗描述
-            self.cursor.execute('''
-                UPDATE skills
-                SET experience = ?
-                WHERE id IN (
-                    SELECT s.id
-                    FROM skills s
-                    JOIN persons p ON s.person_id = p.id
-                    WHERE p.name = ? AND s.category = ? AND s.name = ?
-                )
-            ''', (new_experience, person_name, category, skill_name))
+            self.repo.update_experience(person_name, category, skill_name, new_experience)
             
             self.conn.commit()
             self.refresh_data()
@@ -326,13 +283,8 @@ class SkillTreeApp:
             return
             
         try:
-            self.cursor.execute("SELECT id FROM persons WHERE name = ?", (person,))
-            person_id = self.cursor.fetchone()[0]
-            
-            self.cursor.execute('''
-                INSERT INTO skills (person_id, category, name, experience)
-                VALUES (?, ?, ?, ?)
-            ''', (person_id, category, skill_name, experience))
+            person_id = self.repo.person_id(person)
+            self.repo.add_skill(person_id, category, skill_name, experience)
             
             self.conn.commit()
             self.refresh_data()
@@ -389,41 +341,19 @@ class SkillTreeApp:
             
         try:
             # 獲取技能ID
-            self.cursor.execute('''
-                SELECT s.id
-                FROM skills s
-                JOIN persons p ON s.person_id = p.id
-                WHERE p.name = ? AND s.category = ? AND s.name = ?
-            ''', (person_name, category, skill_name))
-            
-            result = self.cursor.fetchone()
-            if not result:
+            skill_id = self.repo.skill_id(person_name, category, skill_name)
+            if skill_id is None:
                 messagebox.showerror("錯誤", "找不到對應的技能記錄")
                 return
-                
-            skill_id = result[0]
             
             # 檢查是否已存在該年度的記錄
-            self.cursor.execute('''
-                SELECT id FROM skill_history
-                WHERE skill_id = ? AND year = ?
-            ''', (skill_id, year))
-            
-            existing_record = self.cursor.fetchone()
-            if existing_record:
+            if self.repo.history_exists(skill_id, year):
                 if messagebox.askyesno("確認", f"已存在 {year} 年度的記錄，是否要更新？"):
-                    self.cursor.execute('''
-                        UPDATE skill_history
-                        SET level = ?, approve = ?
-                        WHERE skill_id = ? AND year = ?
-                    ''', (level, approve, skill_id, year))
+                    self.repo.update_history(skill_id, year, level, approve)
                 else:
                     return
             else:
-                self.cursor.execute('''
-                    INSERT INTO skill_history (skill_id, year, level, approve)
-                    VALUES (?, ?, ?, ?)
-                ''', (skill_id, year, level, approve))
+                self.repo.add_history(skill_id, year, level, approve)
             
             self.conn.commit()
             self.refresh_data()
@@ -545,21 +475,13 @@ class SkillTreeApp:
             
         try:
             # 獲取技能ID
-            self.cursor.execute('''
-                SELECT s.id
-                FROM skills s
-                JOIN persons p ON s.person_id = p.id
-                WHERE p.name = ? AND s.category = ? AND s.name = ?
-            ''', (person_name, category, skill_name))
-            
-            skill_id = self.cursor.fetchone()[0]
-            
+            skill_id = self.repo.skill_id(person_name, category, skill_name)
+            if skill_id is None:
+                messagebox.showerror("錯誤", "找不到對應的技能記錄")
+                return
+
             # 更新歷史記錄
-            self.cursor.execute('''
-                UPDATE skill_history
-                SET level = ?, approve = ?
-                WHERE skill_id = ? AND year = ?
-            ''', (level, approve, skill_id, year))
+            self.repo.update_history(skill_id, year, level, approve)
             
             self.conn.commit()
             self.refresh_data()
@@ -580,21 +502,9 @@ class SkillTreeApp:
             
         export_data = {}
         
-        self.cursor.execute("SELECT name FROM persons")
-        persons = [row[0] for row in self.cursor.fetchall()]
-        
-        for person in persons:
+        for person, skills in self.iter_skill_tree():
             person_skills = []
-            
-            self.cursor.execute('''
-                SELECT s.id, s.category, s.name, s.experience
-                FROM skills s
-                JOIN persons p ON s.person_id = p.id
-                WHERE p.name = ?
-            ''', (person,))
-            
-            skills = self.cursor.fetchall()
-            for skill_id, category, skill_name, experience in skills:
+            for category, skill_name, experience, histories in skills:
                 skill_data = {
                     "category": category,
                     "name": skill_name,
@@ -602,14 +512,6 @@ class SkillTreeApp:
                     "history": []
                 }
                 
-                self.cursor.execute('''
-                    SELECT year, level, approve
-                    FROM skill_history
-                    WHERE skill_id = ?
-                    ORDER BY year
-                ''', (skill_id,))
-                
-                histories = self.cursor.fetchall()
                 for year, level, approve in histories:
                     skill_data["history"].append({
                         "year": year,
@@ -636,32 +538,18 @@ class SkillTreeApp:
             
         for person, skills in import_data.items():
             # 新增或獲取人員ID
-            self.cursor.execute('''
-                INSERT OR IGNORE INTO persons (name)
-                VALUES (?)
-            ''', (person,))
-            
-            self.cursor.execute("SELECT id FROM persons WHERE name = ?", (person,))
-            person_id = self.cursor.fetchone()[0]
+            person_id = self.repo.ensure_person(person)
             
             for skill in skills:
                 # 新增或更新技能
-                self.cursor.execute('''
-                    INSERT OR REPLACE INTO skills (person_id, category, name, experience)
-                    VALUES (?, ?, ?, ?)
-                ''', (person_id, skill['category'], skill['name'], skill['experience']))
-                
-                skill_id = self.cursor.lastrowid
+                skill_id = self.repo.replace_skill(person_id, skill['category'], skill['name'],
+                                                   skill['experience'])
                 
-                # 刪除舊的歷史記錄
-                self.cursor.execute("DELETE FROM skill_history WHERE skill_id = ?", (skill_id,))
-                
-                # 新增歷史記錄
-                for history in skill['history']:
-                    self.cursor.execute('''
-                        INSERT INTO skill_history (skill_id, year, level, approve)
-                        VALUES (?, ?, ?, ?)
-                    ''', (skill_id, history['year'], history['level'], history['approve']))
+                # 以新的歷史記錄取代舊的 (批次寫入)
+                self.repo.replace_histories(skill_id, [
+                    (history['year'], history['level'], history['approve'])
+                    for history in skill['history']
+                ])
         
         self.conn.commit()
         self.update_tree()
@@ -679,17 +567,7 @@ class SkillTreeApp:
             # 寫入標題行
             writer.writerow(['Person', 'Category', 'Skill', 'Experience', 'Year', 'Level', 'Approve'])
             
-            self.cursor.execute("""
-                SELECT p.name, s.category, s.name, s.experience, 
-                       h.year, h.level, h.approve
-                FROM persons p
-                JOIN skills s ON p.id = s.person_id
-                LEFT JOIN skill_history h ON s.id = h.skill_id
-                ORDER BY p.name, s.category, s.name, h.year
-            """)
-            
-            for row in self.cursor.fetchall():
-                writer.writerow(row)
+            writer.writerows(self.repo.csv_rows())
 
     def import_csv(self):
         filename = filedialog.askopenfilename(
@@ -703,42 +581,33 @@ class SkillTreeApp:
             current_person = None
             current_skill = None
             current_skill_id = None
+            histories = []
             
             for row in reader:
                 # 檢查並添加人員
                 if current_person != row['Person']:
                     current_person = row['Person']
-                    self.cursor.execute('''
-                        INSERT OR IGNORE INTO persons (name)
-                        VALUES (?)
-                    ''', (current_person,))
-                    
-                    self.cursor.execute("SELECT id FROM persons WHERE name = ?", (current_person,))
-                    person_id = self.cursor.fetchone()[0]
+                    person_id = self.repo.ensure_person(current_person)
+                    current_skill = None
                 
                 # 檢查並添加技能
                 skill_key = (row['Category'], row['Skill'])
                 if current_skill != skill_key:
                     current_skill = skill_key
-                    self.cursor.execute('''
-                        INSERT OR REPLACE INTO skills (person_id, category, name, experience)
-                        VALUES (?, ?, ?, ?)
-                    ''', (person_id, row['Category'], row['Skill'], row['Experience']))
-                    current_skill_id = self.cursor.lastrowid
+                    current_skill_id = self.repo.replace_skill(person_id, row['Category'], row['Skill'],
+                                                               row['Experience'])
                 
-                # 添加歷史記錄
+                # 添加歷史記錄 (最後一次批次寫入)
                 if row['Year']:  # 只有在有年份資料時才添加歷史記錄
-                    self.cursor.execute('''
-                        INSERT OR REPLACE INTO skill_history (skill_id, year, level, approve)
-                        VALUES (?, ?, ?, ?)
-                    ''', (current_skill_id, row['Year'], int(row['Level']), row['Approve']))
+                    histories.append((current_skill_id, row['Year'], int(row['Level']), row['Approve']))
             
+            self.repo.upsert_histories(histories)
             self.conn.commit()
             self.update_tree()
 
     def __del__(self):
-        if hasattr(self, 'conn'):
-            self.conn.close()
+        if hasattr(self, 'repo'):
+            self.repo.close()
 
 def main():
     root = tk.Tk()